@@ -1,21 +1,70 @@
 import streamlit as st
-import joblib
-import json
 import base64
+import io
+import os
 import numpy as np
-
-# Load model and column names
-@st.cache_resource
-def load_model():
-    return joblib.load('random_forest_regressor_model.pkl')
+import pandas as pd
+
+import lookup_table
+import prediction_cache
+import predictor
+import profiling
+from predictor import validate_inputs
+
+# 'model' runs the forest on every click; 'lookup' answers from the
+# precomputed price_table.npy and only falls back to the model off-grid.
+# Without a table built from the current model, lookup runs the model too
+INFERENCE_MODE = os.environ.get('PRICE_INFERENCE_MODE', 'model')
+
+# Load model and column names. The model is cached per file modification
+# time, so a model refreshed by incremental.py is picked up on the next
+# rerun without restarting the app
+@st.cache_resource(max_entries=1)
+def load_model(path, mtime):
+    return predictor.load_model(path)
 
 @st.cache_data
-def load_columns():
-    with open('columns-v1.json', 'r') as file:
-        return json.load(file)
+def load_columns(path):
+    return predictor.load_columns(path)
 
-model = load_model()
-columns = load_columns()
+@st.cache_data
+def load_location_index(columns):
+    return predictor.build_location_index(columns)
+
+# Cached per model and table version, so a rebuilt table is reloaded
+@st.cache_resource(max_entries=1)
+def load_price_table(_model, version, table_version):
+    return lookup_table.load_table(fallback=_model, model_version=version)
+
+# One cache per model version, shared by every session of this server
+# process and persisted to prediction_cache.json
+@st.cache_resource(max_entries=1)
+def load_prediction_cache(version):
+    return prediction_cache.PredictionCache(version, path=prediction_cache.CACHE_PATH)
+
+# Bulk uploads are parsed and scored once per file contents and model
+# version, not again on every rerun of the page
+@st.cache_data(max_entries=8)
+def score_upload(data, version, _model, columns):
+    listings = pd.read_csv(io.BytesIO(data))
+    return predictor.score_listings(_model, listings, columns, predictor.build_location_index(columns))
+
+# The manifest is read once per rerun, so the model and its columns file
+# always come from the same refresh
+model_path, columns_path = predictor.default_paths()
+model_mtime = os.path.getmtime(model_path)
+model = load_model(model_path, model_mtime)
+columns = load_columns(columns_path)
+location_index = load_location_index(columns)
+model_version = prediction_cache.model_version(model_path)
+table_version = lookup_table.table_version() if INFERENCE_MODE == 'lookup' else None
+price_table = load_price_table(model, model_version, table_version) if table_version is not None else None
+# A table built for other columns would misplace locations; rebuild it with
+# lookup_table.py after a refresh that added columns
+if price_table is not None and price_table.columns != columns:
+    price_table = None
+price_cache = load_prediction_cache(prediction_cache.model_version(
+    model_path, f"lookup:{table_version}" if price_table is not None else 'model'))
 
 # Function to convert image to base64
 def get_base64_image(img_path):
@@ -149,33 +198,21 @@ def add_bg_image():
 # Call the function to add the background image and styling
 add_bg_image()
 
-# Define input validators
-def validate_inputs(area, bedrooms, baths, unit='Square Yards'):
-    min_area_per_bedroom = 16  # square yards
-    min_area_per_bathroom = 6  # square yards
-    
-    if unit == 'Square Feet':
-        area = area / 9  # Convert square feet to square yards
-    
-    required_area = bedrooms * min_area_per_bedroom + baths * min_area_per_bathroom
-    
-    if required_area > area:
-        min_area_sqft = required_area * 9
-        return False, f"{bedrooms} bedrooms and {baths} bathrooms are not possible in {area:.2f} square yards. Minimum required area is {min_area_sqft:.2f} square feet."
-    return True, ""
-
-# Prediction function
-def predict_price(model, location, area, bedrooms, baths):
-    loc_index = columns.index(location) if location in columns else -1
-    
-    x = np.zeros(len(columns))
-    x[0] = baths
-    x[1] = area
-    x[2] = bedrooms
-    if loc_index >= 0:
-        x[loc_index] = 1
-    
-    return model.predict([x])[0] / 1000000
+# Prediction function; timer collects per-stage timings when PRICE_PROFILE
+# is set (cache hits skip the feature_build and predict stages)
+def predict_price(model, location, area, bedrooms, baths, timer=profiling.NULL_TIMER):
+    return price_cache.get_or_compute(location, area, bedrooms, baths,
+                                      lambda: compute_price(model, location, area, bedrooms, baths, timer))
+
+def compute_price(model, location, area, bedrooms, baths, timer=profiling.NULL_TIMER):
+    loc_idx = np.array([location_index.get(location, -1)])
+    if price_table is not None:
+        with timer.stage('lookup'):
+            return price_table.predict(loc_idx, area, bedrooms, baths)[0] / 1000000
+    with timer.stage('feature_build'):
+        x = predictor.build_feature_matrix(loc_idx, area, bedrooms, baths, len(columns))
+    with timer.stage('predict'):
+        return model.predict(x)[0] / 1000000
 
 # App content starts here
 st.title("🏠 Karachi House Price Prediction")
@@ -191,38 +228,65 @@ if 'input_values' not in st.session_state:
         'no_of_bathrooms': 1
     }
 
-# Layout with Columns
-col1, col2 = st.columns(2)
-
-with col1:
-    location_columns = columns[3:]
-    st.session_state.input_values['location'] = st.selectbox("Select Location", location_columns, index=location_columns.index(st.session_state.input_values['location']), key='location')
-
-    st.session_state.input_values['area_unit'] = st.selectbox("Area Unit", ['Square Yards', 'Square Feet'], index=0, key='area_unit')
-
-    st.session_state.input_values['area'] = st.number_input(f"Area in {st.session_state.input_values['area_unit']}", min_value=0, step=1, value=st.session_state.input_values['area'], help="Enter the total area of the house.", key='area')
-
-with col2:
-    st.session_state.input_values['no_of_bedrooms'] = st.number_input("Number of Bedrooms", min_value=1, step=1, value=st.session_state.input_values['no_of_bedrooms'], help="Enter the number of bedrooms in the house.", key='no_of_bedrooms')
-
-    st.session_state.input_values['no_of_bathrooms'] = st.number_input("Number of Bathrooms", min_value=1, step=1, value=st.session_state.input_values['no_of_bathrooms'], help="Enter the number of bathrooms in the house.", key='no_of_bathrooms')
-
-# Validate inputs
-valid, message = validate_inputs(st.session_state.input_values['area'], st.session_state.input_values['no_of_bedrooms'], st.session_state.input_values['no_of_bathrooms'], st.session_state.input_values['area_unit'])
-
-# Display minimum area requirement
-if st.session_state.input_values['area_unit'] == 'Square Feet':
-    min_area_sqft = (st.session_state.input_values['no_of_bedrooms'] * 16 + st.session_state.input_values['no_of_bathrooms'] * 6) * 9
-    st.markdown(f"<p class='subheader'>For {st.session_state.input_values['no_of_bedrooms']} bedrooms and {st.session_state.input_values['no_of_bathrooms']} bathrooms, the minimum required area is {min_area_sqft:.2f} square feet.</p>", unsafe_allow_html=True)
-
-# Predict price
-if st.button("🔍 Predict Price", key='predict_button'):
-    if valid:
-        area_in_yards = st.session_state.input_values['area'] if st.session_state.input_values['area_unit'] == 'Square Yards' else st.session_state.input_values['area'] / 9
-        price = predict_price(model, st.session_state.input_values['location'], area_in_yards, st.session_state.input_values['no_of_bedrooms'], st.session_state.input_values['no_of_bathrooms'])
-        st.markdown(f"<p class='success'>🏷️ The estimated house price is {price:.2f} Lakhs</p>", unsafe_allow_html=True)
-    else:
-        st.markdown(f"<p class='error'>{message}</p>", unsafe_allow_html=True)
+single_tab, bulk_tab = st.tabs(["Single Prediction", "Bulk Scoring"])
+
+with single_tab:
+    # Layout with Columns
+    col1, col2 = st.columns(2)
+
+    with col1:
+        location_columns = columns[3:]
+        st.session_state.input_values['location'] = st.selectbox("Select Location", location_columns, index=location_columns.index(st.session_state.input_values['location']), key='location')
+
+        st.session_state.input_values['area_unit'] = st.selectbox("Area Unit", ['Square Yards', 'Square Feet'], index=0, key='area_unit')
+
+        st.session_state.input_values['area'] = st.number_input(f"Area in {st.session_state.input_values['area_unit']}", min_value=0, step=1, value=st.session_state.input_values['area'], help="Enter the total area of the house.", key='area')
+
+    with col2:
+        st.session_state.input_values['no_of_bedrooms'] = st.number_input("Number of Bedrooms", min_value=1, step=1, value=st.session_state.input_values['no_of_bedrooms'], help="Enter the number of bedrooms in the house.", key='no_of_bedrooms')
+
+        st.session_state.input_values['no_of_bathrooms'] = st.number_input("Number of Bathrooms", min_value=1, step=1, value=st.session_state.input_values['no_of_bathrooms'], help="Enter the number of bathrooms in the house.", key='no_of_bathrooms')
+
+    # Validate inputs
+    valid, message = validate_inputs(st.session_state.input_values['area'], st.session_state.input_values['no_of_bedrooms'], st.session_state.input_values['no_of_bathrooms'], st.session_state.input_values['area_unit'])
+
+    # Display minimum area requirement
+    if st.session_state.input_values['area_unit'] == 'Square Feet':
+        min_area_sqft = (st.session_state.input_values['no_of_bedrooms'] * 16 + st.session_state.input_values['no_of_bathrooms'] * 6) * 9
+        st.markdown(f"<p class='subheader'>For {st.session_state.input_values['no_of_bedrooms']} bedrooms and {st.session_state.input_values['no_of_bathrooms']} bathrooms, the minimum required area is {min_area_sqft:.2f} square feet.</p>", unsafe_allow_html=True)
+
+    # Predict price
+    if st.button("🔍 Predict Price", key='predict_button'):
+        if valid:
+            area_in_yards = st.session_state.input_values['area'] if st.session_state.input_values['area_unit'] == 'Square Yards' else st.session_state.input_values['area'] / 9
+            timer = profiling.request_timer('predict_price')
+            price = predict_price(model, st.session_state.input_values['location'], area_in_yards, st.session_state.input_values['no_of_bedrooms'], st.session_state.input_values['no_of_bathrooms'], timer)
+            with timer.stage('render'):
+                st.markdown(f"<p class='success'>🏷️ The estimated house price is {price:.2f} Lakhs</p>", unsafe_allow_html=True)
+            timer.log()
+        else:
+            st.markdown(f"<p class='error'>{message}</p>", unsafe_allow_html=True)
+
+    cache_stats = price_cache.stats()
+    st.caption(f"Prediction cache: {cache_stats['entries']} entries, {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+               f"{cache_stats['evictions']} evictions ({cache_stats['hit_rate']:.0%} hit rate)")
+
+with bulk_tab:
+    st.markdown("<p class='subheader'>Upload a CSV of listings to price them all at once.</p>", unsafe_allow_html=True)
+    uploaded_file = st.file_uploader("Listings CSV (Address, NoOfBedrooms, NoOfBathrooms, AreaSqYards or location, area, bedrooms, baths)", type='csv', key='bulk_upload')
+
+    if uploaded_file is not None:
+        try:
+            scored = score_upload(uploaded_file.getvalue(), model_version, model, columns)
+        except KeyError as exc:
+            st.markdown(f"<p class='error'>Missing column {exc} in the uploaded file.</p>", unsafe_allow_html=True)
+        except ValueError as exc:
+            # pd.errors.ParserError and EmptyDataError are ValueErrors too
+            st.markdown(f"<p class='error'>Could not score the uploaded file: {exc}</p>", unsafe_allow_html=True)
+        else:
+            st.markdown(f"<p class='success'>Priced {len(scored)} listings.</p>", unsafe_allow_html=True)
+            st.dataframe(scored)
+            st.download_button("Download predictions", scored.to_csv(index=False), file_name='predictions.csv', mime='text/csv', key='bulk_download')
 
 # About section
 st.markdown("---")
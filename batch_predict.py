@@ -0,0 +1,48 @@
+"""Score a CSV of listings in bulk.
+
+Usage:
+    python batch_predict.py house-prices-in-karachi-pakistan-2023.csv predictions.csv
+
+The input is read in chunks so files much larger than memory can be
+scored; each chunk is priced with a single model.predict call per
+--chunk-size rows and appended to the output file.
+"""
+import argparse
+import time
+
+import pandas as pd
+
+import predictor
+
+
+def score_csv(model, columns, input_path, output_path, chunk_size=predictor.DEFAULT_CHUNK_SIZE):
+    location_index = predictor.build_location_index(columns)
+    n_rows = 0
+    for i, chunk in enumerate(pd.read_csv(input_path, chunksize=chunk_size)):
+        scored = predictor.score_listings(model, chunk, columns, location_index, chunk_size)
+        scored.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        n_rows += len(chunk)
+    return n_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict house prices for every listing in a CSV file.")
+    parser.add_argument('input', help="CSV with Address/NoOfBedrooms/NoOfBathrooms/AreaSqYards columns, or location/area/bedrooms/baths")
+    parser.add_argument('output', help="where to write the input rows plus a PredictedPrice column")
+    parser.add_argument('--model', default=None, help="defaults to the model named in model-manifest.json, else the packed artifact if built, else the pickle")
+    parser.add_argument('--columns', default=None, help="defaults to the columns file of the default model")
+    parser.add_argument('--chunk-size', type=int, default=predictor.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    default_model_path, default_columns_path = predictor.default_paths()
+    model = predictor.load_model(args.model or default_model_path)
+    columns = predictor.load_columns(args.columns or default_columns_path)
+
+    start = time.perf_counter()
+    n_rows = score_csv(model, columns, args.input, args.output, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {n_rows} listings in {elapsed:.2f}s ({n_rows / max(elapsed, 1e-9):.0f} rows/s) -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
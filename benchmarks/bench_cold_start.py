@@ -0,0 +1,112 @@
+"""Cold start and per-worker memory of the pickled vs packed model.
+
+Usage:
+    python benchmarks/bench_cold_start.py random_forest_regressor_model.pkl random_forest_regressor_model.forest --workers 4
+
+For each artifact, starts --workers fresh interpreters at once. Each one
+imports predictor, loads the model, prices one listing and, once all of
+them are loaded, reads its memory from /proc/self/smaps_rollup. PSS splits
+shared pages between the processes mapping them, so it is the per-worker
+cost when several app workers run side by side.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds to wait for the workers to load, price and report
+WORKER_TIMEOUT = 300
+
+
+def memory_kb():
+    fields = {}
+    with open('/proc/self/smaps_rollup', 'r') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+# Runs in a freshly spawned interpreter, so imports are part of the timing.
+# A failing worker breaks the barrier and reports its error, so the others
+# and the parent stop waiting
+def worker(path, barrier, results):
+    try:
+        start = time.perf_counter()
+        sys.path.insert(0, ROOT)
+        import warnings
+        warnings.filterwarnings('ignore')
+
+        import numpy as np
+        import predictor
+
+        model = predictor.load_model(path)
+        loaded = time.perf_counter()
+        # Packed forests know their input width as n_features, sklearn
+        # models as n_features_in_; the listing is priced as 'others'
+        n_features = getattr(model, 'n_features', None) or model.n_features_in_
+        model.predict(predictor.build_feature_matrix(np.array([-1]), 240, 3, 3, n_features))
+        first_prediction = time.perf_counter()
+
+        barrier.wait(WORKER_TIMEOUT)
+        results.put({
+            'load': loaded - start,
+            'first_prediction': first_prediction - start,
+            'sklearn': 'sklearn' in sys.modules,
+            **memory_kb(),
+        })
+    except Exception as exc:
+        barrier.abort()
+        results.put({'error': f"{type(exc).__name__}: {exc}"})
+
+
+def measure(path, n_workers):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(n_workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(path, barrier, results)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    try:
+        rows = [results.get(timeout=WORKER_TIMEOUT) for _ in processes]
+    except queue.Empty:
+        rows = [{'error': f"no result within {WORKER_TIMEOUT}s"}]
+    for process in processes:
+        process.join(WORKER_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
+    errors = sorted({row['error'] for row in rows if 'error' in row})
+    if errors:
+        sys.exit(f"{os.path.basename(path)}: worker failed: {'; '.join(errors)}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('artifacts', nargs='+', help="model files to compare (.pkl and/or .forest)")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'artifact':<44}{'size MB':>9}{'load s':>9}{'first s':>9}{'RSS MB':>9}{'PSS MB':>9}{'priv MB':>9}  sklearn")
+    for path in args.artifacts:
+        rows = measure(os.path.abspath(path), args.workers)
+
+        def mean(field):
+            return statistics.mean(r[field] for r in rows)
+
+        print(f"{os.path.basename(path):<44}{os.path.getsize(path) / 1e6:>9.1f}{mean('load'):>9.2f}"
+              f"{mean('first_prediction'):>9.2f}{mean('rss') / 1024:>9.1f}{mean('pss') / 1024:>9.1f}"
+              f"{mean('private') / 1024:>9.1f}  {'yes' if any(r['sklearn'] for r in rows) else 'no'}")
+
+
+if __name__ == '__main__':
+    main()
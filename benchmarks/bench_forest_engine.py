@@ -0,0 +1,87 @@
+"""Parity check and latency benchmark for forest_engine.FlatForest.
+
+Usage:
+    python benchmarks/bench_forest_engine.py --model random_forest_regressor_model.pkl
+
+Predicts every listing in the dataset with model.predict, FlatForest.predict
+and FlatForest.predict_raw, fails if they disagree, then times single-row
+and batched calls for each path.
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import predictor  # noqa: E402
+from forest_engine import flatten_forest  # noqa: E402
+
+
+# The notebook fits on a DataFrame, so sklearn warns on every array input
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+
+def time_call(fn, repeat):
+    fn()  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=predictor.MODEL_PATH)
+    parser.add_argument('--columns', default=predictor.COLUMNS_PATH)
+    parser.add_argument('--data', default='house-prices-in-karachi-pakistan-2023.csv')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    model = predictor.load_model(args.model)
+    columns = predictor.load_columns(args.columns)
+    location_index = predictor.build_location_index(columns)
+
+    start = time.perf_counter()
+    forest = flatten_forest(model)
+    print(f"Flattened {forest.n_trees} trees ({forest.n_nodes} nodes, depth {forest.max_depth}) in {time.perf_counter() - start:.2f}s")
+
+    records = predictor.listings_to_records(pd.read_csv(args.data))
+    loc_idx = predictor.location_indexes(records['location'], location_index)
+    area = records['area'].to_numpy(dtype=np.float64)
+    bedrooms = records['bedrooms'].to_numpy(dtype=np.float64)
+    baths = records['baths'].to_numpy(dtype=np.float64)
+    X = predictor.build_feature_matrix(loc_idx, area, bedrooms, baths, len(columns))
+
+    # Parity
+    expected = model.predict(X)
+    for name, got in [('predict', forest.predict(X)),
+                      ('predict_raw', forest.predict_raw(loc_idx, bedrooms, baths, area))]:
+        max_err = np.max(np.abs(got - expected) / np.maximum(np.abs(expected), 1))
+        print(f"parity {name:<12} max relative error {max_err:.2e} over {len(X)} rows")
+        if not np.allclose(got, expected, rtol=1e-9, atol=1e-6):
+            sys.exit(f"FlatForest.{name} does not match model.predict")
+
+    # Latency
+    print(f"\n{'path':<24}{'batch':>8}{'median':>14}{'per row':>14}")
+    for batch in (1, 100, len(X)):
+        repeat = args.repeat if batch < len(X) else max(args.repeat // 10, 3)
+        xb, lb, bb, tb, ab = X[:batch], loc_idx[:batch], bedrooms[:batch], baths[:batch], area[:batch]
+        paths = [
+            ('model.predict', lambda: model.predict(xb)),
+            ('FlatForest.predict', lambda: forest.predict(xb)),
+            ('FlatForest.predict_raw', lambda: forest.predict_raw(lb, bb, tb, ab)),
+        ]
+        for name, fn in paths:
+            elapsed = time_call(fn, repeat)
+            print(f"{name:<24}{batch:>8}{elapsed * 1e3:>12.3f}ms{elapsed / batch * 1e6:>12.2f}us")
+
+
+if __name__ == '__main__':
+    main()
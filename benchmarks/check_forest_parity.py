@@ -0,0 +1,72 @@
+"""Self-contained parity check for forest_engine.FlatForest.
+
+Usage:
+    python benchmarks/check_forest_parity.py
+    python benchmarks/check_forest_parity.py --trees 20 --max-depth 12
+
+Fits a small RandomForestRegressor on the cleaned listings (the notebook's
+training split), flattens it, and checks that FlatForest.predict and
+FlatForest.predict_raw return model.predict on every training and
+held-out row, plus rows at an unknown location. Needs no model file;
+exits non-zero on any mismatch.
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import predictor  # noqa: E402
+from forest_engine import flatten_forest  # noqa: E402
+from train import load_training_data, make_model  # noqa: E402
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+
+# Location column of each one-hot row, or -1 for rows without one
+def one_hot_locations(X):
+    locations = X[:, predictor.NUM_NUMERIC_COLS:]
+    return np.where(locations.any(axis=1), locations.argmax(axis=1) + predictor.NUM_NUMERIC_COLS, -1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default='house-prices-in-karachi-pakistan-2023.csv')
+    parser.add_argument('--trees', type=int, default=8)
+    parser.add_argument('--max-depth', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    X_train, X_test, y_train, _, _ = load_training_data(args.data)
+    model = make_model('random_forest', {'n_estimators': args.trees, 'max_depth': args.max_depth})
+    model.fit(X_train, y_train)
+    forest = flatten_forest(model)
+    print(f"Fitted {forest.n_trees} trees ({forest.n_nodes} nodes, depth {forest.max_depth}) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    X = np.vstack([np.asarray(X_train, dtype=np.float64), np.asarray(X_test, dtype=np.float64)])
+    unknown = X[:100].copy()
+    unknown[:, predictor.NUM_NUMERIC_COLS:] = 0
+    X = np.vstack([X, unknown])
+    loc_idx = one_hot_locations(X)
+    bedrooms, baths, area = (X[:, col] for col in (predictor.BEDROOMS_COL, predictor.BATHS_COL, predictor.AREA_COL))
+
+    expected = model.predict(X)
+    failed = []
+    for name, got in [('predict', forest.predict(X)),
+                      ('predict_raw', forest.predict_raw(loc_idx, bedrooms, baths, area))]:
+        max_err = np.max(np.abs(got - expected) / np.maximum(np.abs(expected), 1))
+        print(f"parity {name:<12} max relative error {max_err:.2e} over {len(X)} rows")
+        if not np.allclose(got, expected, rtol=1e-9, atol=1e-6):
+            failed.append(name)
+    if failed:
+        sys.exit(f"FlatForest.{', '.join(failed)} does not match model.predict")
+    print("FlatForest matches model.predict")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Load generator for serve.py, with request batching on and off.
+
+Usage:
+    python benchmarks/loadgen.py random_forest_regressor_model.pkl --concurrency 64 --duration 10
+    python benchmarks/loadgen.py --url http://127.0.0.1:8000 --concurrency 64
+
+Starts serve.py twice on a free local port, once with batching off
+(--max-batch-size 1 --max-wait-us 0) and once with --max-batch-size and
+--max-wait-us, and drives each with --concurrency keep-alive connections
+sending random valid listings back to back for --duration seconds. With
+--url it drives an already running server instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import predictor  # noqa: E402
+import serve  # noqa: E402
+
+
+def random_bodies(columns, n, seed=0):
+    rng = random.Random(seed)
+    locations = list(predictor.build_location_index(columns)) + ['others']
+    bodies = []
+    for _ in range(n):
+        bedrooms = rng.randint(1, 6)
+        baths = rng.randint(1, bedrooms + 1)
+        area = rng.randint(bedrooms * 16 + baths * 6, 1000)
+        bodies.append(json.dumps({'location': rng.choice(locations), 'area': area,
+                                  'bedrooms': bedrooms, 'baths': baths}).encode())
+    return bodies
+
+
+def request_bytes(host, body):
+    return (f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, requests, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        writer.write(requests[i % len(requests)])
+        status = await read_response(reader)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+        i += 1
+    writer.close()
+
+
+async def run_load(host, port, bodies, concurrency, duration):
+    requests = [request_bytes(host, body) for body in bodies]
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(client(host, port, requests[i::concurrency], deadline, latencies, errors)
+                           for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': len(latencies) / elapsed,
+        'p50': float(np.percentile(latencies, 50)),
+        'p99': float(np.percentile(latencies, 99)),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(port, process, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("serve.py exited before it started listening")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("serve.py did not start listening in time")
+
+
+def serve_and_load(model, max_batch_size, max_wait_us, bodies, args):
+    port = free_port()
+    command = [sys.executable, '-W', 'ignore', os.path.join(ROOT, 'serve.py'), '--port', str(port),
+               '--max-batch-size', str(max_batch_size), '--max-wait-us', str(max_wait_us)]
+    if model:
+        command += ['--model', model]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(port, process)
+        asyncio.run(run_load('127.0.0.1', port, bodies, args.concurrency, 1.0))  # warm-up
+        return asyncio.run(run_load('127.0.0.1', port, bodies, args.concurrency, args.duration))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def print_result(label, result):
+    print(f"{label:<28}{result['requests']:>9}{result['throughput']:>11.0f}{result['p50']:>10.2f}"
+          f"{result['p99']:>10.2f}{result['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure serve.py latency and throughput with and without batching.")
+    parser.add_argument('model', nargs='?', default=None, help="defaults to the model named in model-manifest.json, else the packed artifact if built, else the pickle")
+    parser.add_argument('--url', help="drive this running server instead of starting serve.py")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per run")
+    parser.add_argument('--max-batch-size', type=int, default=serve.DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-us', type=int, default=serve.DEFAULT_MAX_WAIT_US)
+    args = parser.parse_args()
+
+    bodies = random_bodies(predictor.load_columns(predictor.default_columns_path()), 10000)
+
+    print(f"{args.concurrency} connections, {args.duration:g}s per run")
+    print(f"{'':<28}{'requests':>9}{'req/s':>11}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    if args.url:
+        host, port = args.url.split('://', 1)[-1].rstrip('/').rsplit(':', 1)
+        print_result(args.url, asyncio.run(run_load(host, int(port), bodies, args.concurrency, args.duration)))
+        return
+    print_result("batching off", serve_and_load(args.model, 1, 0, bodies, args))
+    print_result(f"batch {args.max_batch_size}, wait {args.max_wait_us}us",
+                 serve_and_load(args.model, args.max_batch_size, args.max_wait_us, bodies, args))
+
+
+if __name__ == '__main__':
+    main()
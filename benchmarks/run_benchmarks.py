@@ -0,0 +1,294 @@
+"""Prediction, model loading, preprocessing and training benchmarks.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output bench-results.json
+    python benchmarks/run_benchmarks.py --suites prediction load --output new.json --compare bench-results.json
+    python benchmarks/run_benchmarks.py --suites preprocessing --scales 1 10 100
+
+Suites:
+    prediction     single-row latency of the app's predict_price path
+                   (feature build + model.predict, and a prediction cache
+                   hit) and batched throughput through predict_batch
+    load           model load time and peak RSS, each artifact measured in
+                   a fresh interpreter
+    preprocessing  parse / statistics / cleaning time on the dataset
+                   replicated 1x, 10x, 100x
+    training       fit and predict time per estimator of the notebook's
+                   model zoo on the cleaned training split; XGBRegressor
+                   is skipped when xgboost is not installed
+
+Results are written as JSON. --compare prints every metric next to the
+same metric of an earlier results file, and with --fail-above exits
+non-zero when any metric got worse by more than that percentage.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import prediction_cache  # noqa: E402
+import predictor  # noqa: E402
+import preprocessing  # noqa: E402
+
+SUITES = ['prediction', 'load', 'preprocessing', 'training']
+BATCH_SIZES = [100, 1000, 10000]
+TRAINING_MODELS = ['linear_regression', 'lasso', 'decision_tree', 'random_forest', 'xgboost']
+
+# The notebook fits on a DataFrame, so sklearn warns on every array input
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+
+def timings(fn, repeat):
+    fn()  # warm up
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed.append(time.perf_counter() - start)
+    return np.array(elapsed)
+
+
+def latency(elapsed):
+    return {'median_ms': float(np.median(elapsed) * 1e3), 'p99_ms': float(np.percentile(elapsed, 99) * 1e3)}
+
+
+def dataset_records(data_path):
+    return predictor.listings_to_records(pd.read_csv(data_path))
+
+
+def bench_prediction(args):
+    model = predictor.load_model(args.model)
+    columns = predictor.load_columns(args.columns)
+    location_index = predictor.build_location_index(columns)
+    records = dataset_records(args.data)
+    first = records.iloc[0]
+    results = {}
+
+    def predict_price():
+        loc_idx = np.array([location_index.get(first['location'], -1)])
+        x = predictor.build_feature_matrix(loc_idx, first['area'], first['bedrooms'], first['baths'], len(columns))
+        return model.predict(x)[0] / 1000000
+    results['single_row'] = latency(timings(predict_price, args.repeat))
+
+    cache = prediction_cache.PredictionCache('benchmark')
+    cache.get_or_compute(first['location'], first['area'], first['bedrooms'], first['baths'], predict_price)
+    results['single_row_cache_hit'] = latency(timings(
+        lambda: cache.get_or_compute(first['location'], first['area'], first['bedrooms'], first['baths'], predict_price),
+        args.repeat))
+
+    for batch in BATCH_SIZES:
+        rows = records.sample(batch, replace=True, random_state=0)
+        elapsed = timings(lambda: predictor.predict_batch(model, rows, columns, location_index), max(args.repeat // 10, 3))
+        results[f'batch_{batch}'] = {**latency(elapsed), 'rows_per_s': float(batch / np.median(elapsed))}
+    return results
+
+
+# High-water mark of this process's RSS. Unlike getrusage's ru_maxrss it
+# starts over on exec, so a spawned worker does not report its parent's peak
+def peak_rss_mb():
+    with open('/proc/self/status', 'r') as file:
+        for line in file:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+
+
+# Runs in a freshly spawned interpreter so the load is really cold
+def load_worker(path, results):
+    sys.path.insert(0, ROOT)
+    import predictor
+
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    predictor.load_model(path)
+    results.put({
+        'load_s': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+        'load_peak_rss_mb': peak_rss_mb() - before,
+    })
+
+
+def bench_load(args):
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for path in args.load_models:
+        runs = []
+        for _ in range(args.load_runs):
+            queue = context.Queue()
+            process = context.Process(target=load_worker, args=(os.path.abspath(path), queue))
+            process.start()
+            runs.append(queue.get())
+            process.join()
+        results[os.path.basename(path)] = {
+            'size_mb': os.path.getsize(path) / 1e6,
+            **{field: float(np.median([run[field] for run in runs])) for field in runs[0]},
+        }
+    return results
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_preprocessing(args):
+    base = pd.read_csv(args.data)
+    results = {}
+    for scale in args.scales:
+        scaled = pd.concat([base] * scale, ignore_index=True)
+        parsed, parse_s = timed(preprocessing.parse_listings, scaled)
+        stats, stats_s = timed(preprocessing.compute_stats, lambda: [parsed])
+        cleaned, clean_s = timed(preprocessing.clean_parsed, parsed, stats)
+        iqr = preprocessing.within_iqr(preprocessing.group_small_locations(parsed, stats.small_locations),
+                                       stats.lower_bound, stats.upper_bound)
+        _, bhk_s = timed(preprocessing.remove_bhk_outliers, iqr, stats.bhk_stats)
+        total_s = parse_s + stats_s + clean_s
+        results[f'{scale}x'] = {
+            'rows': len(scaled),
+            'rows_kept': len(cleaned),
+            'parse_s': parse_s,
+            'stats_s': stats_s,
+            'clean_s': clean_s,
+            'remove_bhk_outliers_s': bhk_s,
+            'total_s': total_s,
+            'rows_per_s': len(scaled) / total_s,
+        }
+    return results
+
+
+def make_estimator(name):
+    from train import make_model
+    if name == 'xgboost':
+        from xgboost import XGBRegressor
+        return XGBRegressor(random_state=0, n_jobs=1)
+    return make_model(name, {})
+
+
+def bench_training(args):
+    from sklearn.metrics import r2_score
+    from train import load_training_data
+
+    X_train, X_test, y_train, y_test, _ = load_training_data(args.data)
+    results = {}
+    for name in TRAINING_MODELS:
+        try:
+            model = make_estimator(name)
+        except ImportError as exc:
+            print(f"  skipping {name}: {exc}")
+            continue
+        _, fit_s = timed(model.fit, X_train, y_train)
+        predictions, predict_s = timed(model.predict, X_test)
+        results[name] = {
+            'fit_s': fit_s,
+            'predict_s': predict_s,
+            'r2': float(r2_score(y_test, predictions)),
+        }
+    return results
+
+
+BENCHMARKS = {
+    'prediction': bench_prediction,
+    'load': bench_load,
+    'preprocessing': bench_preprocessing,
+    'training': bench_training,
+}
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def higher_is_better(metric):
+    return metric.endswith(('_per_s', '.r2'))
+
+
+# Percentage change of each shared metric, positive when it got worse
+def compare(new, old):
+    new, old = flatten(new), flatten(old)
+    rows = []
+    for metric in sorted(set(new) & set(old)):
+        if metric.startswith('meta.') or not old[metric]:
+            continue
+        change = (new[metric] - old[metric]) / abs(old[metric]) * 100
+        rows.append((metric, old[metric], new[metric], -change if higher_is_better(metric) else change))
+    return rows
+
+
+def print_comparison(rows, fail_above):
+    print(f"\n{'metric':<52}{'before':>14}{'after':>14}{'worse by':>11}")
+    for metric, before, after, worse in rows:
+        flag = '  <-' if fail_above is not None and worse > fail_above else ''
+        print(f"{metric:<52}{before:>14.4g}{after:>14.4g}{worse:>10.1f}%{flag}")
+
+
+def meta():
+    import sklearn
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'cpu_count': os.cpu_count(),
+        'machine': platform.machine(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES)
+    parser.add_argument('--model', default=None, help="model for the prediction suite (default: what the app loads)")
+    parser.add_argument('--load-models', nargs='+', default=None, help="artifacts for the load suite (default: --model)")
+    parser.add_argument('--load-runs', type=int, default=3)
+    parser.add_argument('--columns', default=None, help="defaults to the columns file of the default model")
+    parser.add_argument('--data', default='house-prices-in-karachi-pakistan-2023.csv')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--fail-above', type=float, default=None, help="exit non-zero if a metric got this many percent worse")
+    args = parser.parse_args()
+    default_model_path, default_columns_path = predictor.default_paths()
+    args.model = args.model or default_model_path
+    args.columns = args.columns or default_columns_path
+    args.load_models = args.load_models or [args.model]
+
+    results = {'meta': meta()}
+    for suite in args.suites:
+        print(f"{suite}...")
+        start = time.perf_counter()
+        results[suite] = BENCHMARKS[suite](args)
+        for metric, value in flatten(results[suite]).items():
+            print(f"  {metric:<50}{value:>14.4g}")
+        print(f"  ({time.perf_counter() - start:.1f}s)")
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            rows = compare(results, json.load(file))
+        print_comparison(rows, args.fail_above)
+        if args.fail_above is not None and any(worse > args.fail_above for *_, worse in rows):
+            sys.exit(f"Metrics regressed by more than {args.fail_above}%")
+
+
+if __name__ == '__main__':
+    main()
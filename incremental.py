@@ -0,0 +1,413 @@
+"""Incremental model refresh from new listings.
+
+Usage:
+    python incremental.py init house-prices-in-karachi-pakistan-2023.csv
+    python incremental.py update new-listings.csv --add-trees 20 --max-trees 400
+
+`init` reads the existing listings once and keeps, in .refresh-state/,
+the running statistics that the cleaning steps need:
+
+- listings per location, for grouping small locations into 'others';
+- a log-spaced histogram of the price per square yard (QuantileSketch),
+  from which the IQR bounds are read to within one bin (~0.3%);
+- count, mean and M2 (Welford) of the price per square yard per
+  (location, bedrooms), merged into 'others' for small locations, which is
+  what remove_bhk_outliers compares against.
+
+`update` folds a CSV of new listings into those statistics and cleans
+just those rows with preprocessing.clean_parsed, so a refresh costs
+O(new rows) instead of re-cleaning the whole feed. Rows cleaned by earlier
+refreshes are not revisited when the bounds move.
+
+The cleaned rows are appended to cleaned.csv and sampled into a fixed-size
+reservoir. If no location crossed LOCATION_THRESHOLD, a forest gets
+--add-trees new trees (warm_start) fitted on the reservoir plus the new
+rows, dropping the oldest trees past --max-trees; a regressor with
+partial_fit is updated on the new rows instead. When a location crosses
+the threshold it gets its own feature column, so the columns file is
+versioned (columns-v1.json -> columns-v2.json) and the model is refit on
+all of cleaned.csv.
+
+Each refreshed model is written to the next versioned path
+(random_forest_regressor_model.pkl -> random_forest_regressor_model-v2.pkl),
+and only then is model-manifest.json replaced to name it and its columns
+file, so a reader never pairs a model with another refresh's columns. The
+app reads the manifest on every rerun and loads the refreshed model
+without a restart.
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import predictor
+import preprocessing
+
+STATE_DIR = '.refresh-state'
+SKETCH_MIN = 100  # price per square yard
+SKETCH_MAX = 1e8
+SKETCH_BINS = 4096
+RESERVOIR_SIZE = 5000
+ADD_TREES = 20
+
+
+# Mergeable histogram over log-spaced bins; quantiles are interpolated
+# geometrically inside the bin that holds them
+class QuantileSketch:
+    def __init__(self, counts=None, low=SKETCH_MIN, high=SKETCH_MAX, n_bins=SKETCH_BINS):
+        self.low = low
+        self.high = high
+        self.edges = np.geomspace(low, high, n_bins + 1)
+        self.counts = np.zeros(n_bins, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    def add(self, values):
+        bins = np.clip(np.searchsorted(self.edges, values, side='right') - 1, 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def quantile(self, qs):
+        cumulative = np.cumsum(self.counts)
+        ranks = np.asarray(qs) * cumulative[-1]
+        bins = np.minimum(np.searchsorted(cumulative, ranks, side='left'), len(self.counts) - 1)
+        before = np.where(bins > 0, cumulative[bins - 1], 0)
+        fraction = (ranks - before) / np.maximum(self.counts[bins], 1)
+        lo, hi = self.edges[bins], self.edges[bins + 1]
+        return lo * (hi / lo) ** fraction
+
+
+# Combine count/mean/m2 rows that share a key (Chan et al.'s pairwise
+# update, vectorized over groups); keys default to the index levels
+def combine_moments(moments, keys=None):
+    if keys is None:
+        keys = [moments.index.get_level_values(i) for i in range(moments.index.nlevels)]
+    by = [np.asarray(key) for key in keys]
+    count = moments['count']
+    total = count.groupby(by).transform('sum')
+    mean = (count * moments['mean']).groupby(by).transform('sum') / total
+    parts = pd.DataFrame({
+        'count': count,
+        'weighted': count * moments['mean'],
+        'm2': moments['m2'] + count * (moments['mean'] - mean) ** 2,
+    }).groupby(by).sum()
+    parts.index.names = moments.index.names
+    return pd.DataFrame({'count': parts['count'], 'mean': parts['weighted'] / parts['count'], 'm2': parts['m2']})
+
+
+def batch_moments(df):
+    grouped = df.groupby(['Area', 'NoOfBedrooms'])['Price_per_sq_yard'].agg(['count', 'mean', 'var'])
+    return pd.DataFrame({
+        'count': grouped['count'],
+        'mean': grouped['mean'],
+        'm2': (grouped['var'] * (grouped['count'] - 1)).fillna(0.0),
+    })
+
+
+class RefreshState:
+    def __init__(self, location_counts, sketch, moments, columns_path, n_cleaned=0):
+        # Listings per location, before any filtering
+        self.location_counts = location_counts
+        # Price per square yard of every listing, for the IQR bounds
+        self.sketch = sketch
+        # count/mean/m2 of the price per square yard per (location as
+        # parsed, NoOfBedrooms), over listings inside the IQR bounds
+        self.moments = moments
+        self.columns_path = columns_path
+        self.n_cleaned = n_cleaned
+
+    @property
+    def bounds(self):
+        return preprocessing.bounds_from_quartiles(*self.sketch.quantile([0.25, 0.75]))
+
+    def observe_counts(self, parsed):
+        self.location_counts = self.location_counts.add(parsed['Area'].value_counts(), fill_value=0).astype(np.int64)
+        self.sketch.add(parsed['Price_per_sq_yard'].to_numpy())
+
+    def observe_moments(self, parsed):
+        inside = preprocessing.within_iqr(parsed, *self.bounds)
+        self.moments = combine_moments(pd.concat([self.moments, batch_moments(inside)]))
+
+    def observe(self, parsed):
+        self.observe_counts(parsed)
+        self.observe_moments(parsed)
+
+    # The same statistics compute_stats gathers in two passes over the feed
+    def cleaning_stats(self):
+        lower_bound, upper_bound = self.bounds
+        stats = preprocessing.CleaningStats(self.location_counts, lower_bound, upper_bound, None)
+        areas = self.moments.index.get_level_values(0)
+        grouped = np.where(areas.isin(stats.small_locations), preprocessing.OTHERS, areas)
+        bedrooms = self.moments.index.get_level_values(1)
+        combined = combine_moments(self.moments, [grouped, bedrooms])
+        stats.bhk_stats = pd.DataFrame({
+            'mean': combined['mean'],
+            'std': np.sqrt(combined['m2'] / combined['count']),
+            'count': combined['count'],
+        })
+        return stats
+
+    # Locations past LOCATION_THRESHOLD that have no feature column yet
+    def new_locations(self, columns):
+        large = self.location_counts.index[self.location_counts > preprocessing.LOCATION_THRESHOLD]
+        return sorted(set(large) - set(columns) - {preprocessing.OTHERS})
+
+
+def state_paths(state_dir):
+    return {name: os.path.join(state_dir, name) for name in ('state.json', 'cleaned.csv', 'reservoir.csv')}
+
+
+def save_state(state, state_dir):
+    moments = state.moments.reset_index()
+    path = state_paths(state_dir)['state.json']
+    with open(path + '.tmp', 'w') as file:
+        json.dump({
+            'columns_path': state.columns_path,
+            'n_cleaned': state.n_cleaned,
+            'location_counts': {name: int(count) for name, count in state.location_counts.items()},
+            'sketch': {'low': state.sketch.low, 'high': state.sketch.high, 'counts': state.sketch.counts.tolist()},
+            'moments': moments.to_numpy().tolist(),
+        }, file)
+    os.replace(path + '.tmp', path)
+
+
+def load_state(state_dir):
+    path = state_paths(state_dir)['state.json']
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No refresh state in {state_dir}; run 'python incremental.py init <listings.csv>' first")
+    with open(path, 'r') as file:
+        saved = json.load(file)
+    sketch = saved['sketch']
+    moments = pd.DataFrame(saved['moments'], columns=['Area', 'NoOfBedrooms', 'count', 'mean', 'm2'])
+    return RefreshState(
+        location_counts=pd.Series(saved['location_counts'], dtype=np.int64),
+        sketch=QuantileSketch(sketch['counts'], sketch['low'], sketch['high'], len(sketch['counts'])),
+        moments=moments.set_index(['Area', 'NoOfBedrooms']),
+        columns_path=saved['columns_path'],
+        n_cleaned=saved['n_cleaned'],
+    )
+
+
+def empty_state(columns_path):
+    moments = pd.DataFrame({'count': [], 'mean': [], 'm2': []},
+                           index=pd.MultiIndex.from_arrays([[], []], names=['Area', 'NoOfBedrooms']))
+    return RefreshState(pd.Series(dtype=np.int64), QuantileSketch(), moments, columns_path)
+
+
+# Parsed listings plus their location as parsed, which clean_parsed keeps
+# while folding Area into 'others'; features are built from it so that a
+# location's earlier rows count once it gets its own column
+def with_location(parsed):
+    return parsed.assign(Location=parsed['Area'])
+
+
+def feature_matrix(cleaned, columns):
+    X, y, _ = preprocessing.to_features(cleaned.assign(Area=cleaned['Location']), columns)
+    return X, y
+
+
+def append_csv(df, path):
+    df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+
+# Reservoir sampling (algorithm R) of all cleaned rows; n_seen rows came
+# before this batch
+def update_reservoir(reservoir, cleaned, n_seen, size=RESERVOIR_SIZE, seed=0):
+    rows = cleaned.reset_index(drop=True)
+    room = max(0, size - len(reservoir))
+    reservoir = pd.concat([reservoir, rows.iloc[:room]], ignore_index=True)
+    rest = rows.iloc[room:]
+    if len(rest):
+        seen = n_seen + room + np.arange(len(rest))
+        slots = np.random.default_rng(seed + n_seen).integers(0, seen + 1)
+        chosen = pd.Series(np.arange(len(rest)), index=slots)[slots < size]
+        chosen = chosen[~chosen.index.duplicated(keep='last')]
+        reservoir.iloc[chosen.index.to_numpy()] = rest.iloc[chosen.to_numpy()][reservoir.columns].to_numpy()
+    return reservoir
+
+
+# How extend_model would update the model: 'warm_start' for a fitted
+# forest, 'partial_fit' for an incremental learner, else None
+def update_method(model):
+    if 'warm_start' in model.get_params() and hasattr(model, 'estimators_'):
+        return 'warm_start'
+    if hasattr(model, 'partial_fit'):
+        return 'partial_fit'
+    return None
+
+
+# Add trees fitted on the replay sample to a forest, or feed the new rows
+# to a regressor that learns incrementally
+def extend_model(model, X_new, y_new, X_replay, y_replay, add_trees=ADD_TREES, max_trees=None):
+    method = update_method(model)
+    if method == 'warm_start':
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + add_trees)
+        model.fit(np.vstack([X_replay, X_new]), np.concatenate([y_replay, y_new]))
+        model.set_params(warm_start=False)
+        if max_trees is not None and len(model.estimators_) > max_trees:
+            model.estimators_ = model.estimators_[-max_trees:]
+            model.set_params(n_estimators=max_trees)
+        return f"{add_trees} trees added, {len(model.estimators_)} in the forest"
+    if method == 'partial_fit':
+        model.partial_fit(X_new, y_new)
+        return f"partial_fit on {len(X_new)} rows"
+    raise ValueError(f"{type(model).__name__} cannot be updated incrementally; retrain it with train.py")
+
+
+# Same estimator and hyperparameters, fitted from scratch
+def refit_model(model, X, y):
+    from sklearn.base import clone
+
+    model = clone(model)
+    if 'warm_start' in model.get_params():
+        model.set_params(warm_start=False)
+    return model.fit(X, y)
+
+
+# name-vN.ext -> the first name-vM.ext after it that does not exist yet, so
+# a refresh never overwrites a model or columns file that may be in use
+def next_version_path(path):
+    stem, ext = os.path.splitext(path)
+    match = re.search(r'-v(\d+)$', stem)
+    version = int(match.group(1)) if match else 1
+    stem = stem[:match.start()] if match else stem
+    while True:
+        version += 1
+        candidate = f"{stem}-v{version}{ext}"
+        if not os.path.exists(candidate):
+            return candidate
+
+
+def save_model(model, path):
+    import joblib
+
+    joblib.dump(model, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def parsed_chunks(data_path, chunk_size):
+    return map(preprocessing.parse_listings, preprocessing.read_listings(data_path, chunk_size))
+
+
+# One-off: statistics, cleaned rows and reservoir for the existing listings,
+# in the same two passes as preprocessing.compute_stats
+def init_state(data_path, columns_path, state_dir, chunk_size=preprocessing.DEFAULT_CHUNK_SIZE):
+    os.makedirs(state_dir, exist_ok=True)
+    paths = state_paths(state_dir)
+    if os.path.exists(paths['cleaned.csv']):
+        os.remove(paths['cleaned.csv'])
+
+    state = empty_state(columns_path)
+    for parsed in parsed_chunks(data_path, chunk_size):
+        state.observe_counts(parsed)
+    for parsed in parsed_chunks(data_path, chunk_size):
+        state.observe_moments(parsed)
+
+    stats = state.cleaning_stats()
+    reservoir = pd.DataFrame()
+    for parsed in parsed_chunks(data_path, chunk_size):
+        cleaned = preprocessing.clean_parsed(with_location(parsed), stats)
+        append_csv(cleaned, paths['cleaned.csv'])
+        reservoir = update_reservoir(reservoir, cleaned, state.n_cleaned)
+        state.n_cleaned += len(cleaned)
+    reservoir.to_csv(paths['reservoir.csv'], index=False)
+    save_state(state, state_dir)
+    return state
+
+
+def update(data_path, model_path, model_output, state_dir, add_trees=ADD_TREES, max_trees=None,
+           chunk_size=preprocessing.DEFAULT_CHUNK_SIZE):
+    paths = state_paths(state_dir)
+    state = load_state(state_dir)
+    columns = predictor.load_columns(state.columns_path)
+    if model_path.endswith('.forest'):
+        raise ValueError(f"{model_path} is a packed artifact; pass the scikit-learn model with --model")
+    model = predictor.load_model(model_path)
+    model_output = model_output or next_version_path(model_path)
+
+    parsed = pd.concat(parsed_chunks(data_path, chunk_size))
+    state.observe(parsed)
+    cleaned = preprocessing.clean_parsed(with_location(parsed), state.cleaning_stats())
+    summary = {'new': len(parsed), 'kept': len(cleaned)}
+    if cleaned.empty:
+        save_state(state, state_dir)
+        return summary
+
+    new_locations = state.new_locations(columns)
+    if not new_locations and update_method(model) is None:
+        raise ValueError(f"{type(model).__name__} cannot be updated incrementally; retrain it with train.py")
+
+    # Nothing on disk changes until the model has been updated, so a failed
+    # refresh can be retried with the same file
+    X_new, y_new = feature_matrix(cleaned, columns)
+    summary['mae_before'] = float(np.mean(np.abs(model.predict(X_new) - y_new)))
+    reservoir = pd.read_csv(paths['reservoir.csv'])
+    columns_path = state.columns_path
+    if new_locations:
+        columns = columns + new_locations
+        columns_path = next_version_path(columns_path)
+        X, y = feature_matrix(pd.concat([pd.read_csv(paths['cleaned.csv']), cleaned], ignore_index=True), columns)
+        model = refit_model(model, X, y)
+        X_new, y_new = feature_matrix(cleaned, columns)
+        summary['update'] = f"refit on {len(X)} rows for new locations {', '.join(new_locations)}"
+    else:
+        X_replay, y_replay = feature_matrix(reservoir, columns)
+        summary['update'] = extend_model(model, X_new, y_new, X_replay, y_replay, add_trees, max_trees)
+    summary['mae_after'] = float(np.mean(np.abs(model.predict(X_new) - y_new)))
+
+    if new_locations:
+        with open(columns_path, 'w') as file:
+            json.dump(columns, file)
+    save_model(model, model_output)
+    append_csv(cleaned, paths['cleaned.csv'])
+    update_reservoir(reservoir, cleaned, state.n_cleaned).to_csv(paths['reservoir.csv'], index=False)
+    state.columns_path = columns_path
+    state.n_cleaned += len(cleaned)
+    save_state(state, state_dir)
+    predictor.write_manifest(model_output, state.columns_path, listings=state.n_cleaned,
+                             refreshed=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    summary['model'] = model_output
+    summary['columns'] = state.columns_path
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the model from new listings without retraining from scratch.")
+    parser.add_argument('command', choices=['init', 'update'])
+    parser.add_argument('data', help="listings CSV: the existing feed for init, the new listings for update")
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--columns', default=predictor.COLUMNS_PATH, help="columns file of the current model (init)")
+    parser.add_argument('--model', default=None, help="scikit-learn model to update (default: the current model)")
+    parser.add_argument('--output', default=None, help="where to write the refreshed model (default: the next version of --model)")
+    parser.add_argument('--add-trees', type=int, default=ADD_TREES)
+    parser.add_argument('--max-trees', type=int, default=None, help="drop the oldest trees beyond this many")
+    parser.add_argument('--chunk-size', type=int, default=preprocessing.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'init':
+        state = init_state(args.data, args.columns, args.state_dir, args.chunk_size)
+        lower_bound, upper_bound = state.bounds
+        print(f"{state.n_cleaned} cleaned listings, {len(state.location_counts)} locations, "
+              f"price per sq yd bounds {lower_bound:.0f}..{upper_bound:.0f} -> {args.state_dir} "
+              f"({time.perf_counter() - start:.1f}s)")
+        return
+
+    model_path = args.model
+    if model_path is None:
+        manifest = predictor.read_manifest() or {}
+        model_path = manifest.get('model') or predictor.default_model_path()
+        if model_path.endswith('.forest'):
+            # model_package.py records the pickle it packed the artifact from
+            model_path = manifest.get('packed', predictor.MODEL_PATH)
+    summary = update(args.data, model_path, args.output, args.state_dir, args.add_trees, args.max_trees, args.chunk_size)
+    print(f"{summary['kept']} of {summary['new']} new listings kept after cleaning")
+    if 'update' in summary:
+        print(f"{summary['update']}; MAE on the new listings {summary['mae_before']:.4g} -> {summary['mae_after']:.4g}")
+        print(f"Wrote {summary['model']} ({summary['columns']}) and {predictor.MANIFEST_PATH} "
+              f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Precomputed per-location price tables.
+
+Usage:
+    python lookup_table.py build --model random_forest_regressor_model.pkl
+    python lookup_table.py report --model random_forest_regressor_model.pkl --area-points 16 32 64 128
+
+`build` evaluates the model once over every location x bedrooms x baths x
+area grid point and writes the prices to price_table.npy (float32, opened
+memory-mapped) with the grid description in price_table.json. At request
+time a price is two table reads plus a linear interpolation in log-area.
+Inputs outside the grid (non-integer or out-of-range bedrooms/baths, or an
+area beyond the grid ends) go to the real model instead. The grid file
+records the version of the model the table was built from, and a table
+built for another model (or a missing one) is not loaded, so retraining
+or refreshing the model never serves the old model's prices.
+
+`report` compares table answers with model.predict on the held-out split
+for several area resolutions, without building the full tables, so the
+grid size can be picked before paying for a build.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+import prediction_cache
+import predictor
+
+TABLE_PATH = 'price_table.npy'
+MIN_ROOMS = 1
+MAX_ROOMS = 10
+MIN_AREA = 25  # square yards
+MAX_AREA = 2000  # square yards
+AREA_POINTS = 256
+
+
+def area_grid(min_area=MIN_AREA, max_area=MAX_AREA, n_points=AREA_POINTS):
+    return np.geomspace(min_area, max_area, n_points)
+
+
+def grid_path(table_path):
+    return os.path.splitext(table_path)[0] + '.json'
+
+
+# Left grid index and interpolation weight of each area on a log scale
+def area_weights(area, grid):
+    log_area = np.log(area)
+    log_grid = np.log(grid)
+    lo = np.clip(np.searchsorted(log_grid, log_area, side='right') - 1, 0, len(grid) - 2)
+    weight = (log_area - log_grid[lo]) / (log_grid[lo + 1] - log_grid[lo])
+    return lo, np.clip(weight, 0, 1)
+
+
+# Table row of each location column index; unknown locations and 'others'
+# (loc_idx -1) share the last row
+def table_locations(loc_idx, n_columns):
+    loc_idx = np.asarray(loc_idx)
+    return np.where(loc_idx >= 0, loc_idx - predictor.NUM_NUMERIC_COLS, n_columns - predictor.NUM_NUMERIC_COLS)
+
+
+def model_prices(model, loc_idx, area, bedrooms, baths, n_columns, chunk_size=50000):
+    prices = np.empty(len(loc_idx))
+    for start in range(0, len(loc_idx), chunk_size):
+        end = start + chunk_size
+        X = predictor.build_feature_matrix(loc_idx[start:end], area[start:end], bedrooms[start:end], baths[start:end], n_columns)
+        prices[start:end] = model.predict(X)
+    return prices
+
+
+def build_table(model, columns, grid, min_rooms=MIN_ROOMS, max_rooms=MAX_ROOMS):
+    n_locations = len(columns) - predictor.NUM_NUMERIC_COLS + 1
+    rooms = np.arange(min_rooms, max_rooms + 1)
+    locs = np.append(np.arange(predictor.NUM_NUMERIC_COLS, len(columns)), -1)
+    loc_idx, bedrooms, baths, area = (a.ravel() for a in np.meshgrid(locs, rooms, rooms, grid, indexing='ij'))
+    prices = model_prices(model, loc_idx, area, bedrooms, baths, len(columns))
+    return prices.reshape(n_locations, len(rooms), len(rooms), len(grid)).astype(np.float32)
+
+
+def save_table(table, grid, columns, model_version, table_path=TABLE_PATH, min_rooms=MIN_ROOMS, max_rooms=MAX_ROOMS):
+    np.save(table_path, table)
+    with open(grid_path(table_path), 'w') as file:
+        json.dump({
+            'model_version': model_version,
+            'area_grid': grid.tolist(),
+            'min_rooms': min_rooms,
+            'max_rooms': max_rooms,
+            'columns': columns,
+        }, file)
+
+
+class PriceTable:
+    def __init__(self, table, grid, columns, min_rooms, max_rooms, fallback=None):
+        self.table = table
+        self.grid = np.asarray(grid)
+        self.columns = columns
+        self.min_rooms = min_rooms
+        self.max_rooms = max_rooms
+        self.fallback = fallback
+
+    def on_grid(self, area, bedrooms, baths):
+        def rooms_ok(rooms):
+            return (rooms == np.round(rooms)) & (rooms >= self.min_rooms) & (rooms <= self.max_rooms)
+        return rooms_ok(bedrooms) & rooms_ok(baths) & (area >= self.grid[0]) & (area <= self.grid[-1])
+
+    def lookup(self, loc_idx, area, bedrooms, baths):
+        lo, weight = area_weights(area, self.grid)
+        loc = table_locations(loc_idx, len(self.columns))
+        bed = bedrooms.astype(np.intp) - self.min_rooms
+        bath = baths.astype(np.intp) - self.min_rooms
+        return self.table[loc, bed, bath, lo] * (1 - weight) + self.table[loc, bed, bath, lo + 1] * weight
+
+    # Same units as model.predict; off-grid rows are priced by the fallback
+    # model (or NaN when there is none)
+    def predict(self, loc_idx, area, bedrooms, baths):
+        loc_idx = np.atleast_1d(np.asarray(loc_idx, dtype=np.intp))
+        area, bedrooms, baths = (np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (area, bedrooms, baths))
+        hit = self.on_grid(area, bedrooms, baths)
+        prices = np.full(len(loc_idx), np.nan)
+        prices[hit] = self.lookup(loc_idx[hit], area[hit], bedrooms[hit], baths[hit])
+        miss = ~hit
+        if miss.any() and self.fallback is not None:
+            prices[miss] = model_prices(self.fallback, loc_idx[miss], area[miss], bedrooms[miss], baths[miss], len(self.columns))
+        return prices
+
+
+# Changes whenever the table is rebuilt, even for the same model; None
+# when no table has been built
+def table_version(table_path=TABLE_PATH):
+    if not os.path.exists(table_path):
+        return None
+    stat = os.stat(table_path)
+    return f"{os.path.basename(table_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+# None when no table has been built, or when model_version is given and the
+# table was built from another model
+def load_table(table_path=TABLE_PATH, fallback=None, model_version=None):
+    if not (os.path.exists(table_path) and os.path.exists(grid_path(table_path))):
+        return None
+    with open(grid_path(table_path), 'r') as file:
+        meta = json.load(file)
+    if model_version is not None and meta.get('model_version') != model_version:
+        return None
+    table = np.load(table_path, mmap_mode='r')
+    return PriceTable(table, meta['area_grid'], meta['columns'], meta['min_rooms'], meta['max_rooms'], fallback)
+
+
+# Held-out rows of the cleaned listings (the notebook's 80/20 split with
+# random_state=10) as location indexes and raw inputs
+def held_out_split(data_path, columns):
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    from preprocessing import clean_dataframe
+
+    cleaned = clean_dataframe(pd.read_csv(data_path))
+    _, test = train_test_split(cleaned, test_size=0.2, random_state=10)
+    loc_idx = predictor.location_indexes(test['Area'], predictor.build_location_index(columns))
+    return (loc_idx, test['AreaSqYards'].to_numpy(dtype=np.float64),
+            test['NoOfBedrooms'].to_numpy(dtype=np.float64), test['NoOfBathrooms'].to_numpy(dtype=np.float64))
+
+
+# Error of table answers against model.predict at one area resolution,
+# evaluating the model only at the grid points each row interpolates between
+def resolution_error(model, columns, grid, loc_idx, area, bedrooms, baths, expected):
+    table = PriceTable(None, grid, columns, MIN_ROOMS, MAX_ROOMS)
+    hit = table.on_grid(area, bedrooms, baths)
+    loc_idx, area, bedrooms, baths, expected = (a[hit] for a in (loc_idx, area, bedrooms, baths, expected))
+    lo, weight = area_weights(area, table.grid)
+    left = model_prices(model, loc_idx, table.grid[lo], bedrooms, baths, len(columns))
+    right = model_prices(model, loc_idx, table.grid[lo + 1], bedrooms, baths, len(columns))
+    answer = left * (1 - weight) + right * weight
+    relative = np.abs(answer - expected) / np.maximum(np.abs(expected), 1)
+    return {
+        'area_points': len(grid),
+        'table_bytes': (len(columns) - predictor.NUM_NUMERIC_COLS + 1) * (MAX_ROOMS - MIN_ROOMS + 1) ** 2 * len(grid) * 4,
+        'on_grid': hit.mean(),
+        'mean_abs_error': np.mean(np.abs(answer - expected)),
+        'median_rel_error': np.median(relative),
+        'p95_rel_error': np.percentile(relative, 95),
+        'max_rel_error': relative.max(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate precomputed price lookup tables.")
+    parser.add_argument('command', choices=['build', 'report'])
+    parser.add_argument('--model', default=None, help="defaults to the model the app serves")
+    parser.add_argument('--columns', default=None, help="defaults to the columns file of the default model")
+    parser.add_argument('--output', default=TABLE_PATH, help="table path for build")
+    parser.add_argument('--data', default='house-prices-in-karachi-pakistan-2023.csv', help="listings for report")
+    parser.add_argument('--min-area', type=float, default=MIN_AREA)
+    parser.add_argument('--max-area', type=float, default=MAX_AREA)
+    parser.add_argument('--area-points', type=int, nargs='+', default=[AREA_POINTS])
+    args = parser.parse_args()
+    default_model_path, default_columns_path = predictor.default_paths()
+    args.model = args.model or default_model_path
+    args.columns = args.columns or default_columns_path
+
+    model = predictor.load_model(args.model)
+    columns = predictor.load_columns(args.columns)
+
+    if args.command == 'build':
+        grid = area_grid(args.min_area, args.max_area, args.area_points[0])
+        table = build_table(model, columns, grid)
+        save_table(table, grid, columns, prediction_cache.model_version(args.model), args.output)
+        print(f"Wrote {table.shape} table ({table.nbytes / 1e6:.1f} MB) for {args.model} -> {args.output}")
+        return
+
+    loc_idx, area, bedrooms, baths = held_out_split(args.data, columns)
+    expected = model_prices(model, loc_idx, area, bedrooms, baths, len(columns))
+    print(f"{'points':>8}{'size MB':>10}{'on grid':>10}{'MAE':>14}{'median rel':>12}{'p95 rel':>10}{'max rel':>10}")
+    for n_points in args.area_points:
+        stats = resolution_error(model, columns, area_grid(args.min_area, args.max_area, n_points),
+                                 loc_idx, area, bedrooms, baths, expected)
+        print(f"{stats['area_points']:>8}{stats['table_bytes'] / 1e6:>10.2f}{stats['on_grid']:>10.1%}"
+              f"{stats['mean_abs_error']:>14.0f}{stats['median_rel_error']:>12.2%}"
+              f"{stats['p95_rel_error']:>10.2%}{stats['max_rel_error']:>10.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Compact, memory-mappable model artifact for fast cold starts.
+
+Usage:
+    python model_package.py random_forest_regressor_model.pkl
+    python model_package.py random_forest_regressor_model.pkl --max-trees 100 --max-depth 24 --compress
+
+Writes random_forest_regressor_model.forest: the flattened forest from
+forest_engine.py without any training-only state, with float32
+thresholds and values and the narrowest integer type that holds the node
+ids and feature indexes. Trees can be dropped (--max-trees) and deep
+subtrees collapsed into leaves (--max-depth); the accuracy change on the
+held-out split is reported either way.
+
+The file is a small JSON header followed by 64-byte aligned raw arrays.
+load_packed maps it read-only and wraps the arrays in place, so there is
+no unpickling, no scikit-learn import, and every app worker on the host
+shares the same page-cache copy. --compress stores the arrays zlib
+compressed instead, which gives a smaller file but is decompressed into
+each worker's own memory on load.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from forest_engine import FOREST_ARRAYS, FlatForest, flatten_forest
+
+PACKED_EXTENSION = '.forest'
+MAGIC = b'HPFOREST'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+
+def packed_path(model_path):
+    return os.path.splitext(model_path)[0] + PACKED_EXTENSION
+
+
+# Node depth of every node, walking down from the roots one level at a time
+def node_depths(forest):
+    depth = np.full(forest.n_nodes, -1, dtype=np.intp)
+    level = np.asarray(forest.roots)
+    d = 0
+    while level.size:
+        depth[level] = d
+        level = level[~forest.is_leaf[level]]
+        level = np.asarray(forest.children[level]).ravel()
+        d += 1
+    return depth
+
+
+# Keep the first max_trees trees and turn every node at max_depth into a
+# leaf; a truncated node predicts the mean of its training samples, which
+# sklearn already stores as its value. Unreachable nodes are dropped and
+# the rest renumbered
+def prune_forest(forest, max_trees=None, max_depth=None):
+    n_trees = forest.n_trees if max_trees is None else min(max_trees, forest.n_trees)
+    end = forest.roots[n_trees] if n_trees < forest.n_trees else forest.n_nodes
+    node_ids = np.arange(end)
+    children = np.array(forest.children[:end])
+    is_leaf = forest.is_leaf[:end].copy()
+
+    depth = node_depths(forest)[:end]
+    if max_depth is not None:
+        cut = depth == max_depth
+        children[cut] = node_ids[cut, None]
+        is_leaf |= cut
+    keep = (depth >= 0) & ((depth <= max_depth) if max_depth is not None else True)
+
+    new_ids = np.cumsum(keep) - 1
+    return FlatForest(
+        feature=np.where(is_leaf, 0, forest.feature[:end])[keep],
+        threshold=np.where(is_leaf, 0, forest.threshold[:end])[keep],
+        children=new_ids[children[keep]],
+        value=np.asarray(forest.value[:end])[keep],
+        roots=new_ids[forest.roots[:n_trees]],
+        max_depth=min(forest.max_depth, max_depth) if max_depth is not None else forest.max_depth,
+        n_features=forest.n_features,
+    )
+
+
+# Largest float32 at or below each threshold: the trees compare float32
+# inputs, and x <= t holds for a float32 x exactly when x <= that value
+def float32_thresholds(threshold):
+    rounded = threshold.astype(np.float32)
+    too_high = rounded.astype(np.float64) > threshold
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def smallest_int_type(max_value):
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+
+
+def compact_arrays(forest):
+    index_type = smallest_int_type(forest.n_nodes)
+    return {
+        'feature': forest.feature.astype(smallest_int_type(forest.n_features)),
+        'threshold': float32_thresholds(forest.threshold),
+        'children': forest.children.astype(index_type),
+        'value': forest.value.astype(np.float32),
+        'roots': forest.roots.astype(index_type),
+    }
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_packed(forest, path, compress=False):
+    arrays = compact_arrays(forest)
+    blobs = {}
+    entries = {}
+    for name in FOREST_ARRAYS:
+        array = np.ascontiguousarray(arrays[name])
+        blob = array.tobytes()
+        blobs[name] = zlib.compress(blob, 6) if compress else blob
+        entries[name] = {'dtype': array.dtype.str, 'shape': array.shape, 'nbytes': len(blobs[name])}
+
+    header = {
+        'version': FORMAT_VERSION,
+        'compressed': compress,
+        'max_depth': forest.max_depth,
+        'n_features': forest.n_features,
+        'arrays': entries,
+    }
+    # Offsets depend on the header length, so lay out with a generous
+    # header size first and pad the header up to it
+    header_size = _aligned(len(MAGIC) + 4 + len(json.dumps(header)) + 64 * len(FOREST_ARRAYS))
+    offset = header_size
+    for name in FOREST_ARRAYS:
+        entries[name]['offset'] = offset
+        offset = _aligned(offset + entries[name]['nbytes'])
+    header_bytes = json.dumps(header).encode()
+    if len(MAGIC) + 4 + len(header_bytes) > header_size:
+        raise ValueError("Packed forest header does not fit its reserved space")
+
+    with open(path, 'wb') as file:
+        file.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for name in FOREST_ARRAYS:
+            file.write(b'\0' * (entries[name]['offset'] - file.tell()))
+            file.write(blobs[name])
+    return os.path.getsize(path)
+
+
+def load_packed(path):
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a packed forest")
+    (header_length,) = struct.unpack_from('<I', buffer, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(buffer[start:start + header_length])
+    if header['version'] != FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {header['version']}, expected {FORMAT_VERSION}")
+
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        if header['compressed']:
+            raw = zlib.decompress(buffer[entry['offset']:entry['offset'] + entry['nbytes']])
+            array = np.frombuffer(raw, dtype=dtype)
+        else:
+            array = np.frombuffer(buffer, dtype=dtype, count=entry['nbytes'] // dtype.itemsize, offset=entry['offset'])
+        arrays[name] = array.reshape(entry['shape'])
+    return FlatForest(**arrays, max_depth=header['max_depth'], n_features=header['n_features'])
+
+
+def accuracy(predictions, y):
+    return {
+        'mae': float(np.mean(np.abs(predictions - y))),
+        'r2': float(1 - np.sum((y - predictions) ** 2) / np.sum((y - np.mean(y)) ** 2)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Package a fitted forest into a compact memory-mappable artifact.")
+    parser.add_argument('model', help="joblib pickle of a RandomForestRegressor or DecisionTreeRegressor")
+    parser.add_argument('--output', help="defaults to the model path with a .forest extension")
+    parser.add_argument('--max-trees', type=int)
+    parser.add_argument('--max-depth', type=int)
+    parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--columns', help="columns file of the model (default: the manifest's when it names the "
+                                          "model or an artifact packed from it, else columns-v1.json)")
+    parser.add_argument('--data', default='house-prices-in-karachi-pakistan-2023.csv', help="listings for the accuracy check")
+    args = parser.parse_args()
+
+    import predictor
+    from train import load_training_data
+
+    output = args.output or packed_path(args.model)
+    columns_path = args.columns
+    if columns_path is None:
+        manifest = predictor.read_manifest() or {}
+        sources = [manifest.get('model'), manifest.get('packed')]
+        named = any(source and os.path.abspath(source) == os.path.abspath(args.model) for source in sources)
+        columns_path = manifest['columns'] if named else predictor.COLUMNS_PATH
+    columns = predictor.load_columns(columns_path)
+    model = predictor.load_model(args.model)
+    if len(columns) != model.n_features_in_:
+        parser.error(f"{args.model} takes {model.n_features_in_} features but {columns_path} has "
+                     f"{len(columns)} columns; pass the model's columns file with --columns")
+    forest = prune_forest(flatten_forest(model), args.max_trees, args.max_depth)
+    size = write_packed(forest, output, args.compress)
+    packed = load_packed(output)
+
+    _, X_test, _, y_test, _ = load_training_data(args.data, columns=columns)
+    before = accuracy(model.predict(X_test), y_test)
+    after = accuracy(packed.predict(X_test), y_test)
+    # Only a checked artifact is named in the manifest
+    predictor.write_manifest(output, columns_path, packed=args.model)
+
+    print(f"{args.model}: {os.path.getsize(args.model) / 1e6:.1f} MB -> {output}: {size / 1e6:.1f} MB "
+          f"({packed.n_trees} trees, {packed.n_nodes} nodes, depth {packed.max_depth}"
+          f"{', compressed' if args.compress else ''}), now named in {predictor.MANIFEST_PATH}")
+    print(f"held-out MAE {before['mae']:.4g} -> {after['mae']:.4g} ({after['mae'] - before['mae']:+.4g}), "
+          f"R² {before['r2']:.5f} -> {after['r2']:.5f} ({after['r2'] - before['r2']:+.5f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""Memoized single predictions, shared across app sessions.
+
+Usage:
+    python prediction_cache.py warm --top 1000
+    python prediction_cache.py stats
+
+Most requests to the app repeat a few popular locations, plot sizes and
+room counts, so predict_price answers repeats from a bounded LRU cache
+(with an optional TTL) instead of running the forest again. Keys are
+(model version, location, area in square yards rounded to AREA_DECIMALS,
+bedrooms, baths); the model version is the model file's name, size and
+modification time, so retraining or repacking the model never serves old
+prices.
+
+With a path the cache is persisted as JSON (every SAVE_EVERY new entries
+and at exit) and reloaded on start; a file written for another model
+version is ignored. `warm` fills the file ahead of time with the most
+frequent (location, area, bedrooms, baths) combinations in the listings
+CSV, priced in one batch.
+"""
+import argparse
+import atexit
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import predictor
+import preprocessing
+
+CACHE_PATH = 'prediction_cache.json'
+MAX_ENTRIES = 10000
+AREA_DECIMALS = 2
+SAVE_EVERY = 100
+WARM_TOP = 1000
+
+# The open cache persisted at each (absolute) path
+_open_caches = {}
+_open_lock = threading.Lock()
+
+
+# Changes whenever the model file is replaced; in lookup mode answers come
+# from the price table, so the mode names the table version
+# ('lookup:<table version>') and they are cached separately
+def model_version(model_path, mode='model'):
+    stat = os.stat(model_path)
+    version = f"{os.path.basename(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return version if mode == 'model' else f"{version}:{mode}"
+
+
+class PredictionCache:
+    def __init__(self, model_version, max_entries=MAX_ENTRIES, ttl=None, path=None, save_every=SAVE_EVERY):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        # Seconds an entry stays valid, or None to keep it until evicted
+        self.ttl = ttl
+        self.path = path
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # key -> (price, time stored), least recently used first
+        self._entries = OrderedDict()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        # Serializes snapshot and write, so saves land in the order taken
+        self._save_lock = threading.Lock()
+        if path is not None:
+            # A cache for a new model version takes the file over from the
+            # old one, which would otherwise write its entries back at exit
+            with _open_lock:
+                previous = _open_caches.get(os.path.abspath(path))
+                if previous is not None:
+                    previous.close()
+                _open_caches[os.path.abspath(path)] = self
+            self.load()
+            atexit.register(self.save)
+
+    def key(self, location, area, bedrooms, baths):
+        return (self.model_version, location, round(float(area), AREA_DECIMALS), int(bedrooms), int(baths))
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1], time.time()):
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, price):
+        with self._lock:
+            self._entries[key] = (float(price), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            save = self.path is not None and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    # Two sessions missing on the same key at once may both compute it;
+    # predictions are deterministic, so the second put is harmless
+    def get_or_compute(self, location, area, bedrooms, baths, compute):
+        key = self.key(location, area, bedrooms, baths)
+        price = self.get(key)
+        if price is None:
+            price = compute()
+            self.put(key, price)
+        return price
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Each save writes its own temporary file, so concurrent saves (from
+    # sessions here or other processes) never clobber each other's
+    def save(self):
+        with self._save_lock:
+            path = self.path
+            if path is None:
+                return
+            with self._lock:
+                entries = [[*key[1:], price, stored_at] for key, (price, stored_at) in self._entries.items()]
+                self._unsaved = 0
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                            dir=os.path.dirname(os.path.abspath(path)))
+            try:
+                with os.fdopen(fd, 'w') as file:
+                    json.dump({'model_version': self.model_version, 'entries': entries}, file)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    # Saves once more and stops persisting; called when a cache for another
+    # model version opens the same path
+    def close(self):
+        if self.path is None:
+            return
+        self.save()
+        atexit.unregister(self.save)
+        with self._save_lock:
+            self.path = None
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r') as file:
+            saved = json.load(file)
+        if saved.get('model_version') != self.model_version:
+            return 0
+        now = time.time()
+        with self._lock:
+            for location, area, bedrooms, baths, price, stored_at in saved['entries']:
+                if not self._expired(stored_at, now):
+                    self._entries[self.key(location, area, bedrooms, baths)] = (price, stored_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return len(self._entries)
+
+
+# The top most frequent valid (location, area, bedrooms, baths) combinations
+# among listings at known locations, counted chunk by chunk
+def frequent_combinations(data_path, location_index, top=WARM_TOP, chunk_size=preprocessing.DEFAULT_CHUNK_SIZE):
+    combination = ['location', 'area', 'bedrooms', 'baths']
+    counts = []
+    for chunk in preprocessing.read_listings(data_path, chunk_size):
+        records = predictor.records_to_frame(predictor.listings_to_records(chunk))
+        records = records[records['location'].isin(list(location_index))]
+        records = records.assign(area=records['area'].round(AREA_DECIMALS))
+        counts.append(records.groupby(combination).size())
+    totals = pd.concat(counts).groupby(level=[0, 1, 2, 3]).sum().sort_values(ascending=False, kind='stable')
+    combos = totals.index.to_frame(index=False).assign(count=totals.to_numpy())
+    valid = [predictor.validate_inputs(row.area, row.bedrooms, row.baths)[0] for row in combos.itertuples()]
+    return combos[valid].head(top).reset_index(drop=True)
+
+
+# Price the combinations in one batch and store them; predict_many takes a
+# frame of location/area/bedrooms/baths and returns prices in the units
+# predict_price uses
+def warm_up(cache, combos, predict_many):
+    prices = predict_many(combos)
+    for row, price in zip(combos.itertuples(), prices):
+        cache.put(cache.key(row.location, row.area, row.bedrooms, row.baths), price)
+    return len(combos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm up or inspect the persisted prediction cache.")
+    parser.add_argument('command', choices=['warm', 'stats'])
+    parser.add_argument('--model', default=None, help="defaults to the model named in model-manifest.json, else the packed artifact if built, else the pickle")
+    parser.add_argument('--mode', choices=['model', 'lookup'], default='model', help="the app's PRICE_INFERENCE_MODE")
+    parser.add_argument('--columns', default=None, help="defaults to the columns file of the default model")
+    parser.add_argument('--cache-path', default=CACHE_PATH)
+    parser.add_argument('--data', default='house-prices-in-karachi-pakistan-2023.csv')
+    parser.add_argument('--top', type=int, default=WARM_TOP)
+    args = parser.parse_args()
+
+    default_model_path, default_columns_path = predictor.default_paths()
+    model_path = args.model or default_model_path
+    mode = args.mode
+    if args.mode == 'lookup':
+        import lookup_table
+        mode = f"lookup:{lookup_table.table_version()}"
+    cache = PredictionCache(model_version(model_path, mode), path=args.cache_path)
+    if args.command == 'stats':
+        print(f"{args.cache_path}: {len(cache)} entries for {cache.model_version}")
+        return
+
+    model = predictor.load_model(model_path)
+    columns = predictor.load_columns(args.columns or default_columns_path)
+    location_index = predictor.build_location_index(columns)
+    table = None
+    if args.mode == 'lookup':
+        table = lookup_table.load_table(fallback=model, model_version=model_version(model_path))
+        if table is None:
+            sys.exit(f"No price table built from {model_path}; the app runs the model, so warm without --mode lookup")
+    if table is not None:
+        def predict_many(frame):
+            loc_idx = predictor.location_indexes(frame['location'], location_index)
+            return table.predict(loc_idx, frame['area'].to_numpy(), frame['bedrooms'].to_numpy(), frame['baths'].to_numpy()) / 1000000
+    else:
+        def predict_many(frame):
+            return predictor.predict_batch(model, frame, columns, location_index)
+
+    start = time.perf_counter()
+    combos = frequent_combinations(args.data, location_index, args.top)
+    n = warm_up(cache, combos, predict_many)
+    cache.save()
+    covered = combos['count'].sum()
+    print(f"Cached {n} combinations covering {covered} listings in {time.perf_counter() - start:.1f}s "
+          f"-> {args.cache_path} ({len(cache)} entries)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import parse_locations
+
+MODEL_PATH = 'random_forest_regressor_model.pkl'
+PACKED_MODEL_PATH = 'random_forest_regressor_model.forest'
+COLUMNS_PATH = 'columns-v1.json'
+# Names the model and columns file to serve; written by train.py,
+# model_package.py and incremental.py
+MANIFEST_PATH = 'model-manifest.json'
+
+# Positions of the numeric features in the model input, in the order of
+# columns-v1.json and of the notebook's training matrix
+BEDROOMS_COL = 0
+BATHS_COL = 1
+AREA_COL = 2
+NUM_NUMERIC_COLS = 3
+
+SQFT_PER_SQYD = 9
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def load_columns(path=COLUMNS_PATH):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+# Packed .forest artifacts (model_package.py) are memory-mapped without
+# importing scikit-learn; anything else is a joblib pickle
+def load_model(path=MODEL_PATH):
+    if path.endswith('.forest'):
+        from model_package import load_packed
+        return load_packed(path)
+    import joblib
+    return joblib.load(path)
+
+
+def read_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+# Replaced atomically, so a reader sees either the old pair or the new one
+def write_manifest(model_path, columns_path, path=MANIFEST_PATH, **details):
+    with open(path + '.tmp', 'w') as file:
+        json.dump({'model': model_path, 'columns': columns_path, **details}, file)
+    os.replace(path + '.tmp', path)
+
+
+# (model path, columns path) from a single read of the manifest; without
+# one, the packed artifact when it has been built, else the pickle
+def default_paths():
+    manifest = read_manifest()
+    if manifest is not None:
+        return manifest['model'], manifest['columns']
+    return (PACKED_MODEL_PATH if os.path.exists(PACKED_MODEL_PATH) else MODEL_PATH), COLUMNS_PATH
+
+
+def default_model_path():
+    return default_paths()[0]
+
+
+def default_columns_path():
+    return default_paths()[1]
+
+
+# Map each location name to its one-hot column once, instead of a
+# linear columns.index() search on every prediction
+def build_location_index(columns):
+    return {name: i for i, name in enumerate(columns) if i >= NUM_NUMERIC_COLS}
+
+
+def to_square_yards(area, unit='Square Yards'):
+    if unit == 'Square Feet':
+        return area / SQFT_PER_SQYD
+    return area
+
+
+# Define input validators
+def validate_inputs(area, bedrooms, baths, unit='Square Yards'):
+    min_area_per_bedroom = 16  # square yards
+    min_area_per_bathroom = 6  # square yards
+
+    area = to_square_yards(area, unit)
+
+    required_area = bedrooms * min_area_per_bedroom + baths * min_area_per_bathroom
+
+    if required_area > area:
+        min_area_sqft = required_area * 9
+        return False, f"{bedrooms} bedrooms and {baths} bathrooms are not possible in {area:.2f} square yards. Minimum required area is {min_area_sqft:.2f} square feet."
+    return True, ""
+
+
+# Turn a DataFrame or an iterable of (location, area, unit, bedrooms, baths)
+# records into equal-length arrays with the area in square yards
+def records_to_frame(records):
+    if isinstance(records, pd.DataFrame):
+        frame = records
+    else:
+        frame = pd.DataFrame.from_records(
+            list(records), columns=['location', 'area', 'unit', 'bedrooms', 'baths'])
+    if 'unit' not in frame:
+        frame = frame.assign(unit='Square Yards')
+    area = frame['area'].to_numpy(dtype=np.float64)
+    in_sqft = (frame['unit'] == 'Square Feet').to_numpy()
+    area = np.where(in_sqft, area / SQFT_PER_SQYD, area)
+    return pd.DataFrame({
+        'location': frame['location'].to_numpy(),
+        'area': area,
+        'bedrooms': frame['bedrooms'].to_numpy(dtype=np.float64),
+        'baths': frame['baths'].to_numpy(dtype=np.float64),
+    }, index=frame.index)
+
+
+# Resolve locations to column indexes; unknown locations (and 'others',
+# which has no column of its own) map to -1
+def location_indexes(locations, location_index):
+    return pd.Series(locations).map(location_index).fillna(-1).to_numpy(dtype=np.intp)
+
+
+# Fill the model input matrix for a whole batch in one pass
+def build_feature_matrix(loc_idx, area, bedrooms, baths, n_columns):
+    n_rows = len(loc_idx)
+    X = np.zeros((n_rows, n_columns))
+    X[:, BEDROOMS_COL] = bedrooms
+    X[:, BATHS_COL] = baths
+    X[:, AREA_COL] = area
+    known = loc_idx >= 0
+    X[np.flatnonzero(known), loc_idx[known]] = 1
+    return X
+
+
+# Predict prices (in the same units as predict_price) for many listings,
+# calling model.predict once per chunk rather than once per row
+def predict_batch(model, records, columns, location_index=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    if location_index is None:
+        location_index = build_location_index(columns)
+    frame = records_to_frame(records)
+    loc_idx = location_indexes(frame['location'], location_index)
+    area = frame['area'].to_numpy()
+    bedrooms = frame['bedrooms'].to_numpy()
+    baths = frame['baths'].to_numpy()
+
+    prices = np.empty(len(frame))
+    for start in range(0, len(frame), chunk_size):
+        end = start + chunk_size
+        X = build_feature_matrix(loc_idx[start:end], area[start:end], bedrooms[start:end], baths[start:end], len(columns))
+        prices[start:end] = model.predict(X)
+    return prices / 1000000
+
+
+# Bring a chunk of the house-prices-in-karachi-pakistan-2023.csv schema
+# (or of a file with explicit location/area/bedrooms/baths columns) into
+# the shape predict_batch expects
+def listings_to_records(chunk):
+    if 'location' in chunk:
+        location = chunk['location']
+    else:
+        location = parse_locations(chunk['Address'])
+    return pd.DataFrame({
+        'location': location,
+        'area': chunk['area'] if 'area' in chunk else chunk['AreaSqYards'],
+        'unit': chunk['unit'] if 'unit' in chunk else 'Square Yards',
+        'bedrooms': chunk['bedrooms'] if 'bedrooms' in chunk else chunk['NoOfBedrooms'],
+        'baths': chunk['baths'] if 'baths' in chunk else chunk['NoOfBathrooms'],
+    }, index=chunk.index)
+
+
+# Score a listings frame, returning it with a PredictedPrice column
+def score_listings(model, listings, columns, location_index=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    records = listings_to_records(listings)
+    scored = listings.copy()
+    scored['PredictedPrice'] = predict_batch(model, records, columns, location_index, chunk_size)
+    return scored
@@ -0,0 +1,260 @@
+"""Data cleaning from "ML code.ipynb" as an importable, vectorized pipeline.
+
+Usage:
+    python preprocessing.py house-prices-in-karachi-pakistan-2023.csv cleaned.csv --chunk-size 100000
+
+The steps are the notebook's, in the same order:
+
+1. drop 'other' addresses and take the first two words of Address as the
+   location, then canonicalize spelling variants (LOCATION_ALIASES);
+2. fold locations with LOCATION_THRESHOLD listings or fewer into 'others';
+3. drop rows outside 1.5 IQR of the price per square yard;
+4. drop n-bedroom listings priced (per square yard) below the mean of
+   (n-1)-bedroom listings in the same location, when there are more than
+   five of those (remove_bhk_outliers);
+5. drop listings with more than two bathrooms over the bedroom count.
+
+Steps 2-4 need dataset-wide statistics. compute_stats gathers them in
+two passes over the CSV before any row is cleaned, after which
+clean_chunk cleans any chunk independently, so clean_csv reads the file
+three times. The passes keep per-location and per-(location, bedrooms)
+aggregates, plus the price per square yard of every listing (8 bytes per
+row) for the exact IQR bounds: memory still grows with the file, by one
+column rather than the whole frame. incremental.py's QuantileSketch gives
+the bounds in fixed memory, to within about 0.3%.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+LOCATION_THRESHOLD = 15
+IQR_FACTOR = 1.5
+MIN_BHK_COUNT = 5
+MAX_EXTRA_BATHS = 2
+DEFAULT_CHUNK_SIZE = 100000
+
+NUMERIC_COLUMNS = ['NoOfBedrooms', 'NoOfBathrooms', 'AreaSqYards']
+OTHERS = 'others'
+
+# Two-word address prefixes and the location they stand for
+LOCATION_ALIASES = {
+    'Gulistan-e-Jauhar -': 'Gulistan-e-Jauhar',
+    'Gulshan-e-Maymar -': 'Gulshan-e-Maymar',
+    'Gulzar-e-Hijri Scheme': 'Gulzar-e-Hijri',
+    'Government Teacher': 'Government Teacher Housing Society',
+    'Emaar The': 'Emaar The Views',
+    'Gulistan-e-Jauhar Karachi': 'Gulistan-e-Jauhar',
+    'Karachi University': 'Karachi University Housing Society',
+    'Federal B': 'Federal B Area',
+    'DHA Phase': 'DHA',
+    'North Town': 'North Town Residency',
+    'North Town Residency, Surjani Town': 'North Town Residency',
+    'Clifton -': 'Clifton Karachi',
+    'Gulshan-e-Iqbal Gulshan-e-Iqbal': 'Gulshan-e-Iqbal',
+    'Nazimabad -': 'Nazimabad',
+    'Gulshan-e-Iqbal Town': 'Gulshan-e-Iqbal',
+    'P &': 'P & T Colony',
+    'State Bank': 'SBP Housing Society',
+    'PECHS Block': 'PECHS',
+    'Korangi -': 'Korangi',
+    'Nazimabad 1': 'Nazimabad',
+    'Gulshan-e-Maymar Gadap': 'Gulshan-e-Maymar',
+    'Korangi Karachi': 'Korangi',
+    'Nazimabad Karachi': 'Nazimabad',
+    'Mehmoodabad Number': 'Mehmoodabad Karachi',
+    'Nazimabad 3': 'Nazimabad',
+    'Karachi Administration': 'KAE Housing Society',
+    'Mohammad Ali': 'Mohammad Ali Society',
+    'Bahadurabad Gulshan-e-Iqbal': 'Bahadurabad',
+    'PECHS Jamshed': 'PECHS',
+    'Khalid Bin': 'Khalid Bin Walid Road',
+    'Tariq Bin': 'Tariq Bin Ziyad Society',
+    'Gulshan-e-Jamal Gulshan-e-Iqbal': 'Gulshan-e-Jamal',
+    'Gulshan-e-Iqbal -': 'Gulshan-e-Iqbal',
+}
+
+
+def read_listings(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    return pd.read_csv(path, chunksize=chunk_size)
+
+
+# First two words of each address (commas removed), canonicalized. Listing
+# feeds repeat the same addresses many times, so each distinct address is
+# parsed once and the result broadcast back. Missing addresses stay NaN
+def parse_locations(addresses):
+    codes, unique = pd.factorize(addresses)
+    words = pd.Series(unique, dtype=object).str.replace(',', '', regex=False).str.split(' ', n=2)
+    prefix = words.str[0] + ' ' + words.str[1].fillna('')
+    locations = prefix.map(LOCATION_ALIASES).fillna(prefix).str.strip().to_numpy(dtype=object)
+    # factorize codes NaN as -1, which would index the last location
+    parsed = np.where(codes < 0, np.nan, locations[codes] if len(locations) else np.nan)
+    return pd.Series(parsed, index=addresses.index, dtype=object)
+
+
+# Step 1: location from Address plus the price per square yard; listings
+# without an address cannot be placed and are dropped
+def parse_listings(chunk):
+    chunk = chunk.loc[(chunk['Address'] != 'other') & chunk['Address'].notna()]
+    parsed = chunk.drop(columns=['Unnamed: 0', 'Address'], errors='ignore')
+    parsed.insert(0, 'Area', parse_locations(chunk['Address']))
+    parsed['Price_per_sq_yard'] = parsed['Price'] / parsed['AreaSqYards']
+    return parsed
+
+
+class CleaningStats:
+    def __init__(self, location_counts, lower_bound, upper_bound, bhk_stats):
+        # Listings per location, before any filtering
+        self.location_counts = location_counts
+        # Price per square yard bounds of the IQR filter
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+        # Price per square yard mean and count per (Area, NoOfBedrooms)
+        # after the IQR filter, indexed by that pair
+        self.bhk_stats = bhk_stats
+
+    @property
+    def small_locations(self):
+        return self.location_counts.index[self.location_counts <= LOCATION_THRESHOLD]
+
+
+# Step 2: fold rarely listed locations into 'others'
+def group_small_locations(parsed, small_locations):
+    parsed = parsed.copy()
+    parsed.loc[parsed['Area'].isin(small_locations), 'Area'] = OTHERS
+    return parsed
+
+
+# Step 3
+def iqr_bounds(price_per_sq_yard):
+    q1, q3 = np.quantile(price_per_sq_yard, [0.25, 0.75])
+    return bounds_from_quartiles(q1, q3)
+
+
+def bounds_from_quartiles(q1, q3):
+    iqr = q3 - q1
+    return q1 - IQR_FACTOR * iqr, q3 + IQR_FACTOR * iqr
+
+
+def within_iqr(parsed, lower_bound, upper_bound):
+    ppsy = parsed['Price_per_sq_yard']
+    return parsed[(ppsy >= lower_bound) & (ppsy <= upper_bound)]
+
+
+# Sum and count of price per square yard per (Area, NoOfBedrooms), which
+# can be added up across chunks
+def bhk_sums(df):
+    return df.groupby(['Area', 'NoOfBedrooms'])['Price_per_sq_yard'].agg(['sum', 'count'])
+
+
+def bhk_stats_from_sums(sums):
+    return pd.DataFrame({'mean': sums['sum'] / sums['count'], 'count': sums['count']})
+
+
+# Step 4: look up each listing's (Area, NoOfBedrooms - 1) statistics in one
+# join instead of looping over locations and bedroom counts
+def remove_bhk_outliers(df, bhk_stats=None):
+    if bhk_stats is None:
+        bhk_stats = bhk_stats_from_sums(bhk_sums(df))
+    smaller = pd.MultiIndex.from_arrays([df['Area'], df['NoOfBedrooms'] - 1])
+    smaller_stats = bhk_stats.reindex(smaller)
+    mean = smaller_stats['mean'].to_numpy()
+    count = smaller_stats['count'].to_numpy()
+    outlier = (count > MIN_BHK_COUNT) & (df['Price_per_sq_yard'].to_numpy() < mean)
+    return df[~outlier]
+
+
+# Step 5
+def remove_bath_outliers(df):
+    return df[~(df['NoOfBathrooms'] > df['NoOfBedrooms'] + MAX_EXTRA_BATHS)]
+
+
+# Dataset-wide statistics in two streaming passes: location counts and the
+# IQR bounds first, then the per-bedroom statistics of the rows that pass
+# the IQR filter. parsed_chunks is a callable returning a fresh iterator
+# of parse_listings output. The exact quartiles need every listing's price
+# per square yard in memory at once
+def compute_stats(parsed_chunks):
+    counts = []
+    ppsy = []
+    for parsed in parsed_chunks():
+        counts.append(parsed['Area'].value_counts())
+        ppsy.append(parsed['Price_per_sq_yard'].to_numpy())
+    location_counts = pd.concat(counts).groupby(level=0).sum()
+    lower_bound, upper_bound = iqr_bounds(np.concatenate(ppsy))
+
+    stats = CleaningStats(location_counts, lower_bound, upper_bound, None)
+    sums = []
+    for parsed in parsed_chunks():
+        parsed = group_small_locations(parsed, stats.small_locations)
+        sums.append(bhk_sums(within_iqr(parsed, lower_bound, upper_bound)))
+    stats.bhk_stats = bhk_stats_from_sums(pd.concat(sums).groupby(level=[0, 1]).sum())
+    return stats
+
+
+def compute_stats_csv(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    return compute_stats(lambda: map(parse_listings, read_listings(path, chunk_size)))
+
+
+# Steps 2-5 for parsed listings, given the dataset-wide statistics; the
+# Price_per_sq_yard helper column is dropped as in the notebook
+def clean_parsed(parsed, stats):
+    parsed = group_small_locations(parsed, stats.small_locations)
+    cleaned = within_iqr(parsed, stats.lower_bound, stats.upper_bound)
+    cleaned = remove_bhk_outliers(cleaned, stats.bhk_stats)
+    cleaned = remove_bath_outliers(cleaned)
+    return cleaned.drop(columns='Price_per_sq_yard')
+
+
+def clean_chunk(chunk, stats):
+    return clean_parsed(parse_listings(chunk), stats)
+
+
+def clean_dataframe(df):
+    parsed = parse_listings(df)
+    stats = compute_stats(lambda: [parsed])
+    return clean_parsed(parsed, stats)
+
+
+def clean_csv(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    stats = compute_stats_csv(input_path, chunk_size)
+    n_rows = 0
+    for i, chunk in enumerate(read_listings(input_path, chunk_size)):
+        cleaned = clean_chunk(chunk, stats)
+        cleaned.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        n_rows += len(cleaned)
+    return n_rows
+
+
+# One-hot encode the cleaned listings into the model's feature matrix. With
+# columns given (e.g. from columns-v1.json) the output follows that order and
+# unseen locations get no location column; otherwise every location except
+# 'others' gets one, sorted as pd.get_dummies does
+def to_features(cleaned, columns=None):
+    if columns is None:
+        locations = sorted(set(cleaned['Area']) - {OTHERS})
+        columns = NUMERIC_COLUMNS + locations
+    n_numeric = len(NUMERIC_COLUMNS)
+    location_index = {name: i for i, name in enumerate(columns) if i >= n_numeric}
+
+    X = np.zeros((len(cleaned), len(columns)))
+    X[:, :n_numeric] = cleaned[NUMERIC_COLUMNS].to_numpy(dtype=np.float64)
+    loc_idx = cleaned['Area'].map(location_index).fillna(-1).to_numpy(dtype=np.intp)
+    known = loc_idx >= 0
+    X[np.flatnonzero(known), loc_idx[known]] = 1
+    return X, cleaned['Price'].to_numpy(dtype=np.float64), list(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean a listings CSV the way the notebook does, in chunks.")
+    parser.add_argument('input', help="CSV in the house-prices-in-karachi-pakistan-2023.csv format")
+    parser.add_argument('output', help="where to write the cleaned listings")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    n_rows = clean_csv(args.input, args.output, args.chunk_size)
+    print(f"Wrote {n_rows} cleaned listings -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
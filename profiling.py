@@ -0,0 +1,57 @@
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+# Set PRICE_PROFILE=1 to log per-stage timings of every app prediction
+PROFILE_ENV = 'PRICE_PROFILE'
+
+logger = logging.getLogger('house_prices.profile')
+
+
+def profiling_enabled():
+    return os.environ.get(PROFILE_ENV, '') not in ('', '0')
+
+
+# Wall time of named stages of one request, logged as a single line
+class StageTimer:
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def log(self):
+        total = time.perf_counter() - self.start
+        stages = ' '.join(f"{name}={seconds * 1e3:.3f}ms" for name, seconds in self.stages.items())
+        logger.info(f"{self.name}: {stages} total={total * 1e3:.3f}ms")
+
+
+# Stand-in when profiling is off, so the hooks cost next to nothing
+class NullTimer:
+    def stage(self, name):
+        return nullcontext()
+
+    def log(self):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def request_timer(name):
+    if not profiling_enabled():
+        return NULL_TIMER
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    return StageTimer(name)
@@ -0,0 +1,325 @@
+"""Headless HTTP prediction service with request micro-batching.
+
+Usage:
+    python serve.py --port 8000 --max-batch-size 32 --max-wait-us 500
+    uvicorn serve:app --port 8000          # same service under an ASGI server
+
+    curl -X POST localhost:8000/predict \\
+         -d '{"location": "DHA", "area": 240, "bedrooms": 3, "baths": 3}'
+
+POST /predict takes the inputs of the Streamlit form (location, area,
+optional unit, bedrooms, baths), checks them with the same
+validate_inputs rules and answers {"price": ...} in the units app.py
+shows. GET /health answers {"status": "ok"}.
+
+Concurrent requests are coalesced: the first request of a batch waits up
+to --max-wait-us for others to arrive (or until --max-batch-size are
+queued), and the whole batch is priced with one model.predict call in a
+worker thread. --max-batch-size 1 --max-wait-us 0 turns batching off.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+
+import numpy as np
+
+import predictor
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_US = 500
+MAX_BODY_BYTES = 64 * 1024
+# Square yards (about 200 acres); larger areas are not houses and would
+# overflow the model's float32 inputs
+MAX_AREA = 1e6
+
+
+class MicroBatcher:
+    def __init__(self, predict_rows, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_us=DEFAULT_MAX_WAIT_US):
+        self.predict_rows = predict_rows
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+        self._pending = []
+        self._has_work = asyncio.Event()
+        self._full = asyncio.Event()
+        self._worker = None
+
+    async def submit(self, row):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        self._has_work.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._has_work.wait()
+            if self.max_wait > 0 and len(self._pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if len(self._pending) < self.max_batch_size:
+                self._full.clear()
+            if not self._pending:
+                self._has_work.clear()
+
+            rows = [row for row, _ in batch]
+            try:
+                prices = await loop.run_in_executor(None, self.predict_rows, rows)
+            except Exception as exc:
+                if len(batch) == 1:
+                    self._settle(batch[0][1], exc=exc)
+                else:
+                    await self._predict_each(batch)
+                continue
+            for (_, future), price in zip(batch, prices):
+                self._settle(future, price)
+
+    # One bad row fails the whole predict call, so the batch is priced again
+    # row by row and only the requests whose row fails get the error
+    async def _predict_each(self, batch):
+        loop = asyncio.get_running_loop()
+        for row, future in batch:
+            try:
+                prices = await loop.run_in_executor(None, self.predict_rows, [row])
+            except Exception as exc:
+                self._settle(future, exc=exc)
+            else:
+                self._settle(future, prices[0])
+
+    @staticmethod
+    def _settle(future, price=None, exc=None):
+        if future.done():
+            return
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(float(price))
+
+
+class BadRequest(Exception):
+    pass
+
+
+# Bedrooms and baths must be whole numbers of at least 1; 3.0 is taken as
+# 3, but 2.5 is rejected rather than truncated
+def room_count(payload, name):
+    value = payload[name]
+    count = float(value)
+    if isinstance(value, bool) or not count.is_integer() or count < 1:
+        raise BadRequest(f"Expected {name} to be a whole number of at least 1, got {value!r}")
+    return int(count)
+
+
+class PredictionService:
+    def __init__(self, model, columns, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_us=DEFAULT_MAX_WAIT_US):
+        self.model = model
+        self.columns = columns
+        self.location_index = predictor.build_location_index(columns)
+        self.max_batch_size = max_batch_size
+        self.max_wait_us = max_wait_us
+        self.batcher = None
+
+    # rows are (loc_idx, area in square yards, bedrooms, baths) tuples
+    def predict_rows(self, rows):
+        loc_idx, area, bedrooms, baths = (np.array(values) for values in zip(*rows))
+        X = predictor.build_feature_matrix(loc_idx, area, bedrooms, baths, len(self.columns))
+        return self.model.predict(X) / 1000000
+
+    def parse_request(self, body):
+        try:
+            payload = json.loads(body)
+            location = payload['location']
+            area = float(payload['area'])
+            bedrooms = room_count(payload, 'bedrooms')
+            baths = room_count(payload, 'baths')
+            unit = payload.get('unit', 'Square Yards')
+        except (ValueError, KeyError, TypeError) as exc:
+            raise BadRequest(f"Expected a JSON object with location, area, bedrooms and baths ({exc})")
+        if not math.isfinite(area) or area <= 0:
+            raise BadRequest(f"Expected area to be a positive number, got {payload['area']!r}")
+        if not isinstance(location, str):
+            raise BadRequest(f"Expected location to be a string, got {location!r}")
+        if location not in self.location_index and location != 'others':
+            raise BadRequest(f"Unknown location {location!r}")
+        if unit not in ('Square Yards', 'Square Feet'):
+            raise BadRequest(f"Unknown area unit {unit!r}")
+        valid, message = predictor.validate_inputs(area, bedrooms, baths, unit)
+        if not valid:
+            raise BadRequest(message)
+        area = predictor.to_square_yards(area, unit)
+        if area > MAX_AREA:
+            raise BadRequest(f"Area of {area:.0f} square yards is above the maximum of {MAX_AREA:.0f}")
+        return (self.location_index.get(location, -1), area, bedrooms, baths)
+
+    # Returns (status code, JSON-serializable payload)
+    async def handle(self, method, path, body):
+        if path == '/health' and method == 'GET':
+            return 200, {'status': 'ok'}
+        if path != '/predict':
+            return 404, {'error': 'Not found'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST'}
+        try:
+            row = self.parse_request(body)
+        except BadRequest as exc:
+            return 400, {'error': str(exc)}
+        if self.batcher is None:
+            self.batcher = MicroBatcher(self.predict_rows, self.max_batch_size, self.max_wait_us)
+        return 200, {'price': await self.batcher.submit(row)}
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+def http_response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+# service.handle, with an unexpected error answered as a 500 instead of
+# dropping the connection
+async def handle_safely(service, method, path, body):
+    try:
+        return await service.handle(method, path, body)
+    except Exception as exc:
+        return 500, {'error': f"Prediction failed: {exc}"}
+
+
+# (method, path, version, lower-cased headers, body length) of a request head
+def parse_head(head):
+    request_line, *header_lines = head.decode('latin-1').split('\r\n')
+    parts = request_line.split(' ')
+    if len(parts) != 3:
+        raise BadRequest(f"Malformed request line {request_line!r}")
+    method, path, version = parts
+    headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise BadRequest(f"Invalid Content-Length {headers['content-length']!r}")
+    return method, path, version, headers, length
+
+
+# Minimal HTTP/1.1 server on asyncio streams, with keep-alive
+async def handle_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            try:
+                method, path, version, headers, length = parse_head(head)
+            except BadRequest as exc:
+                writer.write(http_response(400, {'error': str(exc)}, False))
+                break
+            keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+            if length > MAX_BODY_BYTES:
+                writer.write(http_response(413, {'error': 'Request body too large'}, False))
+                break
+            body = await reader.readexactly(length) if length else b''
+            status, payload = await handle_safely(service, method, path.split('?', 1)[0], body)
+            writer.write(http_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def run_server(service, host, port):
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    print(f"Serving predictions on http://{host}:{port} "
+          f"(max batch {service.max_batch_size}, max wait {service.max_wait_us}us)")
+    async with server:
+        await server.serve_forever()
+
+
+def load_service(model_path=None, columns_path=None,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_us=DEFAULT_MAX_WAIT_US):
+    default_model_path, default_columns_path = predictor.default_paths()
+    model = predictor.load_model(model_path or default_model_path)
+    columns = predictor.load_columns(columns_path or default_columns_path)
+    return PredictionService(model, columns, max_batch_size, max_wait_us)
+
+
+# ASGI entry point; configured through the SERVE_MAX_BATCH_SIZE and
+# SERVE_MAX_WAIT_US environment variables
+class ASGIApp:
+    def __init__(self):
+        self.service = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    self._load()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        self._load()
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        status, payload = await handle_safely(self.service, scope['method'], scope['path'], body)
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+    def _load(self):
+        if self.service is None:
+            self.service = load_service(
+                max_batch_size=int(os.environ.get('SERVE_MAX_BATCH_SIZE', DEFAULT_MAX_BATCH_SIZE)),
+                max_wait_us=int(os.environ.get('SERVE_MAX_WAIT_US', DEFAULT_MAX_WAIT_US)))
+
+
+app = ASGIApp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve house price predictions over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--model', default=None, help="defaults to the model named in model-manifest.json, else the packed artifact if built, else the pickle")
+    parser.add_argument('--columns', default=None, help="defaults to the columns file of the default model")
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-us', type=int, default=DEFAULT_MAX_WAIT_US)
+    args = parser.parse_args()
+
+    service = load_service(args.model, args.columns, args.max_batch_size, args.max_wait_us)
+    try:
+        asyncio.run(run_server(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()